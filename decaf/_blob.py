@@ -3,7 +3,87 @@ of matrix in addition to its gradients.
 """
 
 import cPickle as pickle
+from collections import defaultdict, OrderedDict
 import numpy as np
+import sys
+
+# The dtype used when a blob is initialized without an explicit dtype. Most of
+# the computation in decaf is memory bound, so we default to single precision;
+# set this to np.float64 if you need double precision (e.g. gradient checks).
+DEFAULT_DTYPE = np.float32
+
+# The pool of released blob buffers, indexed by (shape, dtype). When a blob
+# drops an array that nobody else refers to, the array is put here so that
+# later allocations of the same shape and dtype can reuse it instead of going
+# through malloc again. Each bucket holds at most _BLOB_POOL_MAX_SIZE arrays,
+# and the whole pool at most _BLOB_POOL_MAX_BYTES bytes: when it is full, the
+# arrays that were put in first are dropped. Use clear_blob_pool() to free all
+# the pooled memory.
+_BLOB_POOL = defaultdict(list)
+_BLOB_POOL_MAX_SIZE = 4
+_BLOB_POOL_MAX_BYTES = 64 * 1024 * 1024
+# The pooled arrays in the order they were put in, indexed by their ids, and
+# their total size in bytes.
+_BLOB_POOL_ORDER = OrderedDict()
+_blob_pool_bytes = 0
+
+
+def clear_blob_pool():
+    """Drops all the pooled buffers so that their memory can be freed."""
+    global _blob_pool_bytes
+    _BLOB_POOL.clear()
+    _BLOB_POOL_ORDER.clear()
+    _blob_pool_bytes = 0
+
+
+def _pool_key(shape, dtype):
+    """Returns the normalized pool key of the given shape and dtype."""
+    try:
+        shape = tuple(shape)
+    except TypeError:
+        shape = (shape,)
+    return shape, np.dtype(dtype)
+
+
+def _pool_get(shape, dtype):
+    """Returns an uninitialized array of the given shape and dtype, reusing a
+    pooled buffer if there is one.
+    """
+    global _blob_pool_bytes
+    bucket = _BLOB_POOL.get(_pool_key(shape, dtype))
+    if bucket:
+        arr = bucket.pop()
+        del _BLOB_POOL_ORDER[id(arr)]
+        _blob_pool_bytes -= arr.nbytes
+        return arr
+    else:
+        return np.empty(shape, dtype)
+
+
+def _pool_put(arr):
+    """Puts an array into the pool, dropping the oldest pooled arrays if the
+    pool would otherwise exceed _BLOB_POOL_MAX_BYTES.
+    """
+    global _blob_pool_bytes
+    if arr.nbytes > _BLOB_POOL_MAX_BYTES:
+        return
+    if len(_BLOB_POOL.get((arr.shape, arr.dtype), ())) >= _BLOB_POOL_MAX_SIZE:
+        return
+    while _blob_pool_bytes + arr.nbytes > _BLOB_POOL_MAX_BYTES:
+        _, old = _BLOB_POOL_ORDER.popitem(last=False)
+        old_bucket = _BLOB_POOL[(old.shape, old.dtype)]
+        # remove by identity, since == compares arrays elementwise.
+        for i, pooled in enumerate(old_bucket):
+            if pooled is old:
+                del old_bucket[i]
+                break
+        if not old_bucket:
+            del _BLOB_POOL[(old.shape, old.dtype)]
+        _blob_pool_bytes -= old.nbytes
+    # the eviction may have removed the bucket of arr, so we look it up here.
+    _BLOB_POOL[(arr.shape, arr.dtype)].append(arr)
+    _BLOB_POOL_ORDER[id(arr)] = arr
+    _blob_pool_bytes += arr.nbytes
 
 
 # pylint: disable=R0903
@@ -20,6 +100,8 @@ class Blob(object):
     The diff matrix will not be created unless you explicitly run init_diff,
     as many Blobs do not need the gradients to be computed.
     """
+    __slots__ = ('_data', '_diff', '_filler')
+
     def __init__(self, shape=None, dtype=None, filler=None):
         self._data = None
         self._diff = None
@@ -36,23 +118,55 @@ class Blob(object):
                     source_blob._filler)
 
     def clear(self):
-        """Clears a blob data."""
-        self._data = None
-        self._diff = None
+        """Clears a blob data. The buffers are returned to the pool if they
+        are not used elsewhere.
+        """
+        self._release_data()
+        self._release_diff()
+
+    def _release_data(self):
+        """Drops the data, and puts it into the pool if the blob owns it and
+        nobody else refers to it (e.g. a view returned by data()); reusing it
+        would otherwise corrupt the content seen by those references.
+        """
+        data, self._data = self._data, None
+        # The only references left are the local variable and the argument
+        # of getrefcount.
+        if (data is not None and data.flags.owndata and
+            sys.getrefcount(data) == 2):
+            _pool_put(data)
+
+    def _release_diff(self):
+        """Similar to _release_data, but drops the diff."""
+        diff, self._diff = self._diff, None
+        if (diff is not None and diff.flags.owndata and
+            sys.getrefcount(diff) == 2):
+            _pool_put(diff)
 
     def mirror(self, input_array, shape=None):
         """Create the data as a view of the input array. This is useful to
         save space and avoid duplication for data layers.
+
+        The data of a blob is always kept C-contiguous, so that the layers
+        can hand it to blas without further copies. If the input array is
+        not C-contiguous, it is copied once here instead of being mirrored.
         """
         if isinstance(input_array, Blob):
             income_data = input_array.data()
+            if shape is not None:
+                # data() returns the source's own array, so we reshape a view
+                # to leave the source untouched.
+                income_data = income_data.view()
         else:
             income_data = input_array.view()
+        if not income_data.flags.c_contiguous:
+            income_data = np.ascontiguousarray(income_data)
         # check if the shape or dtype changed, in which case we need to
         # reset the diff
         if (self.has_data() and (self._data.shape != income_data.shape
                                  or self._data.dtype != income_data.dtype)):
-            self._diff = None
+            self._release_diff()
+        self._release_data()
         self._data = income_data
         if shape is not None:
             self._data.shape = shape
@@ -61,9 +175,14 @@ class Blob(object):
     def mirror_diff(self, input_array, shape=None):
         """Create the diff as a view of the input array's diff. This is useful
         to save space and avoid duplication for data layers.
+
+        Unlike mirror(), the diff is never copied to make it contiguous, as
+        the caller may rely on writes to it being seen by the input array.
         """
         if isinstance(input_array, Blob):
             self._diff = input_array.diff()
+            if shape is not None:
+                self._diff = self._diff.view()
         else:
             self._diff = input_array.view()
         if shape is not None:
@@ -75,18 +194,25 @@ class Blob(object):
         return self._data is not None
     
     def data(self):
-        """Returns a view of the data."""
+        """Returns the data.
+
+        For speed, this is the underlying array and not a view of it: you may
+        change its content, but should not change its shape in place. If you
+        need a reshaped array, use reshape() or take a view first.
+        """
         if self.has_data():
-            return self._data.view()
+            return self._data
 
     def has_diff(self):
         """Checks if the blob has diff."""
         return self._diff is not None
 
     def diff(self):
-        """Returns a view of the diff."""
+        """Returns the diff. Similar to data(), this is the underlying array,
+        so do not change its shape in place.
+        """
         if self.has_diff():
-            return self._diff.view()
+            return self._diff
 
     def update(self):
         """Update the data field by SUBTRACTING diff to it.
@@ -94,18 +220,36 @@ class Blob(object):
         Note that diff is often used to store the gradients, and most often
         we will perform MINIMIZATION. This is why we always do subtraction
         here.
+
+        When data and diff are C-contiguous and of the same float type, the
+        update is carried out in place by the blas axpy function.
         """
-        self._data -= self._diff
+        # blasdot imports decaf.base through its cuda backend, so we cannot
+        # import it when this module is loaded.
+        from decaf.util import blasdot
+        blasdot.axpy(self._diff, self._data, -1.)
 
-    def init_data(self, shape, dtype, setdata=True):
+    def init_data(self, shape, dtype=None, setdata=True):
         """Initializes the data if necessary. The filler will be always
-        called even if no reallocation of data takes place.
+        called even if no reallocation of data takes place. If dtype is None,
+        DEFAULT_DTYPE is used.
         """
-        if not(self.has_data() and self._data.shape == shape and \
-           self._data.dtype == dtype):
-            self._data = np.empty(shape, dtype)
-            # Since we changed the data, the old diff has to be discarded.
-            self._diff = None
+        if dtype is None:
+            dtype = DEFAULT_DTYPE
+        data = self._data
+        if data is None or data.shape != shape or data.dtype != dtype:
+            # The shape may also be given as a list or an int, so we normalize
+            # it before deciding that the data has to be reallocated.
+            shape, dtype = _pool_key(shape, dtype)
+            realloc = (data is None or data.shape != shape or
+                       data.dtype != dtype)
+            # drop our reference so that the old data may go to the pool.
+            data = None
+            if realloc:
+                # Since we changed the data, the old diff has to be discarded.
+                self._release_data()
+                self._release_diff()
+                self._data = _pool_get(shape, dtype)
         if setdata:
             if self._filler is not None:
                 self._filler.fill(self._data)
@@ -116,15 +260,18 @@ class Blob(object):
     def init_diff(self, setzero=True):
         """Initialize the diff in the same format as data.
         
+        If setzero is False, the content of the diff is left undefined, both
+        when it is reused and when it is newly allocated. Pass False only if
+        you are going to overwrite the whole diff.
+
         Returns diff for easy access.
         """
         if not self.has_data():
             raise ValueError('The data should be initialized first!')
-        if self.has_diff():
-            if setzero:
-                self._diff[:] = 0
-        else:
-            self._diff = np.zeros_like(self._data)
+        if not self.has_diff():
+            self._diff = _pool_get(self._data.shape, self._data.dtype)
+        if setzero:
+            self._diff.fill(0)
         return self.diff()
 
     def swap_data(self, other_blob):
@@ -135,18 +282,25 @@ class Blob(object):
             raise ValueError('Attempting to swap incompatible blobs.')
         self._data, other_blob._data = other_blob._data, self._data
     
-    def __getstate__(self):
+    def __reduce__(self):
         """When pickling, we will simply store the data field and the
         filler of this blob. We do NOT store the diff, since it is often
         binded to a specific run and does not bear much value.
+
+        The state is the same (data, filler) tuple that older versions
+        stored with __getstate__, so previously saved blobs still load.
         """
-        return self.data(), self._filler
+        return Blob, (), (self._data, self._filler)
     
     def __setstate__(self, state):
-        """Recovers the state."""
-        if state[0] is None:
-            Blob.__init__(self, state[1])
-        else:
-            Blob.__init__(self, state[0].shape, state[0].dtype, state[1])
-            self._data[:] = state[0]
+        """Recovers the state. The unpickled array is fresh, so we take it
+        over directly instead of allocating, filling and copying into a new
+        one; it is only copied if it is read-only or not C-contiguous.
+        """
+        data, filler = state
+        Blob.__init__(self, filler=filler)
+        if data is not None:
+            if not (data.flags.writeable and data.flags.c_contiguous):
+                data = data.copy()
+            self._data = data
 
@@ -3,11 +3,13 @@
 
 import cPickle as pickle
 from collections import defaultdict
+from collections import deque
+import gzip
+import itertools
 import logging
-import networkx as nx
 import numpy as np
 
-from decaf._blob import Blob
+from decaf._blob import Blob, clear_blob_pool
 from decaf.puff import Puff
 
 class DecafError(Exception):
@@ -168,6 +170,12 @@ class LossLayer(Layer):
 class SplitLayer(Layer):
     """A layer that splits a blob to multiple blobs."""
 
+    # When summing the gradients of more than two tops, large diffs are
+    # accumulated block by block so that each block of the bottom diff stays
+    # in cache while all the tops are added to it. This is the number of
+    # elements in a block.
+    BLOCK_SIZE = 32768
+
     def __init__(self, **kwargs):
         """Initializes a Split layer.
         """
@@ -176,22 +184,49 @@ class SplitLayer(Layer):
     def forward(self, bottom, top):
         """Computes the forward pass.
 
-        The output will simply mirror the input data.
+        The output will simply mirror the input data. Since data() returns
+        the underlying array, a top that already mirrors it is left alone.
         """
         if len(bottom) != 1:
             raise ValueError(
                 'SplitLayer only accepts one input as its bottom.')
+        data = bottom[0].data()
         for output in top:
-            output.mirror(bottom[0])
+            if output.data() is not data:
+                output.mirror(bottom[0])
 
     def backward(self, bottom, top, propagate_down):
         """Computes the backward pass."""
         if propagate_down:
-            diff = bottom[0].init_diff()
-            for single_top in top:
-                diff[:] += single_top.diff()
+            # The diff is fully overwritten, so we do not need to zero it.
+            diff = bottom[0].init_diff(setzero=False)
+            top_diffs = [single_top.diff() for single_top in top]
+            if len(top_diffs) == 1:
+                diff[:] = top_diffs[0]
+            elif (len(top_diffs) > 2 and diff.size > self.BLOCK_SIZE and
+                  diff.flags.c_contiguous and
+                  all(top_diff.flags.c_contiguous for top_diff in top_diffs)):
+                SplitLayer._accumulate_blocked(
+                    diff.ravel(), [top_diff.ravel() for top_diff in top_diffs],
+                    self.BLOCK_SIZE)
+            else:
+                np.add(top_diffs[0], top_diffs[1], out=diff)
+                for top_diff in top_diffs[2:]:
+                    diff += top_diff
         return 0.
 
+    @staticmethod
+    def _accumulate_blocked(diff, top_diffs, block_size):
+        """Writes the sum of the flat top_diffs to the flat diff, one block
+        at a time.
+        """
+        for start in xrange(0, diff.size, block_size):
+            block = diff[start:start + block_size]
+            np.add(top_diffs[0][start:start + block_size],
+                   top_diffs[1][start:start + block_size], out=block)
+            for top_diff in top_diffs[2:]:
+                block += top_diff[start:start + block_size]
+
     def update(self):
         """Split has nothing to update."""
         pass
@@ -240,6 +275,31 @@ class Regularizer(object):
 
 
 DECAF_PREFIX = '_decaf'
+# The magic bytes at the beginning of a gzip file.
+_GZIP_MAGIC = '\x1f\x8b'
+
+
+def _open_net_file(filename):
+    """Opens a saved network for reading, decompressing it on the fly if it
+    was saved with compression.
+    """
+    file = open(filename, 'rb')
+    if file.read(len(_GZIP_MAGIC)) == _GZIP_MAGIC:
+        file.close()
+        return gzip.open(filename, 'rb')
+    else:
+        file.seek(0)
+        return file
+
+
+def _params_filename(filename):
+    """Returns the file name used by save_params and load_params: numpy.savez
+    appends '.npz' to names that do not end with it, but numpy.load does not.
+    """
+    if filename.endswith('.npz'):
+        return filename
+    else:
+        return filename + '.npz'
 
 
 class Net(object):
@@ -253,7 +313,14 @@ class Net(object):
         if name is None:
             name = 'decaf_net'
         self.name = name
-        self.graph = nx.DiGraph()
+        # The graph is stored as adjacency lists: _succ maps a node (a layer
+        # or blob name) to its successors, and _pred to its predecessors.
+        self._succ = {}
+        self._pred = {}
+        # The per-node flags computed by finish(): need_backward for all
+        # nodes, and propagate_down for layers only.
+        self._need_backward = {}
+        self._propagate_down = {}
         self.blobs = {}
         # layers is a dictionary that maps layer names to actual layers.
         self.layers = {}
@@ -269,6 +336,18 @@ class Net(object):
         # The topological order to execute the layer.
         self._forward_order = None
         self._backward_order = None
+        # The execution schedule, stored as parallel lists built in finish():
+        # the bound layer functions to call, and the bottom and top blobs to
+        # call them with. The backward pass also keeps its propagate_down
+        # flags.
+        self._fwd_fns = None
+        self._pred_fns = None
+        self._fwd_bottoms = None
+        self._fwd_tops = None
+        self._bwd_fns = None
+        self._bwd_bottoms = None
+        self._bwd_tops = None
+        self._bwd_propagate = None
         # input_blobs are all blobs that have no layer producing them - they
         # have to be provided by the user. We only store the blob names.
         self._input_blobs = None
@@ -277,8 +356,13 @@ class Net(object):
         self._output_blobs = None
         self._params = None
         self._finished = False
+        # The topological order of the graph, cached by finish(). It is only
+        # recomputed when the structure of the net has changed since.
+        self._topological_order = None
+        self._graph_dirty = True
 
-    def save(self, filename, store_full=False):
+    def save(self, filename, store_full=False,
+             protocol=pickle.HIGHEST_PROTOCOL, compress=False):
         """Saving the necessary 
         
         When pickling, we will simply store the network structure, but not
@@ -287,6 +371,10 @@ class Net(object):
         data layers and loss layers. If store_full is False, the data and loss
         layers are stripped and not stored - this will enable one to just keep
         necessary layers for future use.
+
+        The network is pickled with the given protocol. If compress is True,
+        the file is gzipped with the fastest compression level; load() and
+        load_from() detect this automatically.
         """
         output = [self.name, {}]
         for name, layer in self.layers.iteritems():
@@ -299,15 +387,24 @@ class Net(object):
             else:
                 output[1][name] = (layer, self.needs[name], self.provides[name])
         # finally, pickle the content.
-        file = open(filename, 'wb')
-        pickle.dump(output, file, protocol=pickle.HIGHEST_PROTOCOL)
+        if compress:
+            file = gzip.open(filename, 'wb', compresslevel=1)
+        else:
+            file = open(filename, 'wb')
+        try:
+            pickle.dump(output, file, protocol=protocol)
+        finally:
+            file.close()
 
     @staticmethod
     def load(filename):
         """Loads a network from file."""
         self = Net()
-        file = open(filename, 'rb')
-        contents = pickle.load(file)
+        file = _open_net_file(filename)
+        try:
+            contents = pickle.load(file)
+        finally:
+            file.close()
         self.name = contents[0]
         for layer, needs, provides in contents[1].values():
             self.add_layer(layer, needs=needs, provides=provides)
@@ -323,8 +420,11 @@ class Net(object):
         the current network, replace the current network's corresponding layer
         with the layer in the file.
         """
-        file = open(filename, 'rb')
-        contents = pickle.load(file)
+        file = _open_net_file(filename)
+        try:
+            contents = pickle.load(file)
+        finally:
+            file.close()
         for name in contents[1]:
             if name in self.layers:
                 self.layers[name] = contents[1][name][0]
@@ -332,6 +432,45 @@ class Net(object):
         # issues.
         self.finish()
 
+    def save_params(self, filename):
+        """Saves only the parameters of the network with numpy.savez.
+
+        Unlike save, no layer is pickled: the file holds the raw parameter
+        arrays, keyed as 'layername.index' where index is the position of the
+        parameter in layer.param(). Parameters that have not been
+        initialized yet are skipped. This is much faster than save for large
+        networks, and is meant to be used together with load_params on a net
+        that has the same structure. Like numpy.savez, '.npz' is appended to
+        filename if it does not end with it.
+        """
+        arrays = {}
+        for name, layer in self.layers.iteritems():
+            for i, param in enumerate(layer.param()):
+                if param.has_data():
+                    arrays['%s.%d' % (name, i)] = param.data()
+        np.savez(_params_filename(filename), **arrays)
+
+    def load_params(self, filename):
+        """Loads the parameters saved by save_params into the current network.
+
+        Similar to load_from, only the layers whose names exist in the current
+        network are loaded; the parameter arrays are copied into the existing
+        blobs, which are reallocated only if their shape or dtype differs.
+        As in save_params, '.npz' is appended to filename if it does not end
+        with it.
+        """
+        contents = np.load(_params_filename(filename))
+        try:
+            for key in contents.files:
+                name, index = key.rsplit('.', 1)
+                if name not in self.layers:
+                    continue
+                arr = contents[key]
+                param = self.layers[name].param()[int(index)]
+                param.init_data(arr.shape, arr.dtype, setdata=False)[:] = arr
+        finally:
+            contents.close()
+
     def add_layer(self, layer, needs=None, provides=None):
         """Add a layer to the current network.
 
@@ -352,13 +491,14 @@ class Net(object):
         if type(provides) is str:
             provides = [provides]
         self._finished = False
+        self._graph_dirty = True
         # Add the layer
         if layer.name in self.layers or layer.name in self.blobs:
             raise InvalidNetError('A name already exists: %s' % layer.name)
         self.layers[layer.name] = layer
         # Add the blobs
-        # TODO: the current check may be slow, consider rewriting.
-        already_provided = sum(self.provides.values(), [])
+        already_provided = set(
+            itertools.chain.from_iterable(self.provides.itervalues()))
         for blobname in provides:
             if blobname in already_provided:
                 raise InvalidNetError(
@@ -407,43 +547,44 @@ class Net(object):
 
     def finish(self):
         """Call this function when you finish the network construction."""
-        # validate and generate the graph
-        self._generate_graph()
-        try:
-            topological_order = nx.topological_sort(self.graph)
-        except nx.NetworkXUnfeasible as error:
-            raise DecafError(error)
+        # validate and generate the graph. If the structure has not changed
+        # since the last call (e.g. when called from load_from()), we reuse
+        # the graph and its topological order.
+        if self._graph_dirty:
+            self._generate_graph()
+            self._topological_order = self._topological_sort()
+            # _generate_graph() may add split layers, which marks the graph
+            # dirty again, so we only clear the flag here.
+            self._graph_dirty = False
+        topological_order = self._topological_order
         # For efficiency reasons, we will see for each layer, whether the
         # backward operation needs to be carried out.
         # This is stored in two parameters:
         #   need_backward: whether the backward pass needs to be carried out.
         #   propagate_down: whether the gradient w.r.t. to the bottom layer
         #       needs to be carried out.
+        need_backward = {}
+        propagate_down = {}
+        layers = self.layers
+        preds = self._pred
         for name in topological_order:
             # whether the predecessor needs backward operation.
-            pred_need_backward = any(self.graph.node[p]['need_backward']
-                                     for p in self.graph.predecessors(name))
-            if name in self.layers:
-                # see if a layer needs backward operation. A layer needs
-                # backward operation if (1) it has parameters and isn't frozen
-                # or (2) any of its predecessors needs backward operation.
-                layer = self.layers[name]
-                if (pred_need_backward or
-                    (len(layer.param()) and not layer.freeze)):
-                    self.graph.node[name]['need_backward'] = True
-                else:
-                    self.graph.node[name]['need_backward'] = False
-                # see if a layer needs to compute its bottom diff. A layer
-                # needs to compute its bottom diff if any of its predecessors
-                # needs backward operation.
-                if pred_need_backward:
-                    self.graph.node[name]['propagate_down'] = True
-                else:
-                    self.graph.node[name]['propagate_down'] = False
+            pred_need_backward = any(need_backward[p] for p in preds[name])
+            layer = layers.get(name)
+            if layer is not None:
+                # A layer needs backward operation if (1) any of its
+                # predecessors needs backward operation or (2) it has
+                # parameters and isn't frozen. It needs to compute its bottom
+                # diff only in case (1).
+                need_backward[name] = pred_need_backward or bool(
+                    len(layer.param()) and not layer.freeze)
+                propagate_down[name] = pred_need_backward
             else:
                 # see if a blob needs backward operation.
                 # This is only used so we can verify further layers.
-                self.graph.node[name]['need_backward'] = pred_need_backward
+                need_backward[name] = pred_need_backward
+        self._need_backward = need_backward
+        self._propagate_down = propagate_down
         # create the order to run forward and backward passes
         layerorder = [name for name in topological_order
                       if name in self.layers]
@@ -457,13 +598,24 @@ class Net(object):
         # logging.debug('Forward order details: %s', str(self._forward_order))
         self._backward_order = []
         for n in layerorder[::-1]:
-            if self.graph.node[n]['need_backward']:
+            if self._need_backward[n]:
                 self._backward_order.append(
                     (n, self.layers[n],
                      [self.blobs[name] for name in self._actual_needs[n]],
                      [self.blobs[name] for name in self.provides[n]],
-                     self.graph.node[n]['propagate_down']))
+                     self._propagate_down[n]))
         # logging.debug('Backward order details: %s', str(self._backward_order))
+        # pre-bind the layer functions and flatten the orders into parallel
+        # lists, so the runs do not need to look up or unpack anything for
+        # every layer on every minibatch.
+        self._fwd_fns = [item[1].forward for item in self._forward_order]
+        self._pred_fns = [item[1].predict for item in self._forward_order]
+        self._fwd_bottoms = [tuple(item[2]) for item in self._forward_order]
+        self._fwd_tops = [tuple(item[3]) for item in self._forward_order]
+        self._bwd_fns = [item[1].backward for item in self._backward_order]
+        self._bwd_bottoms = [tuple(item[2]) for item in self._backward_order]
+        self._bwd_tops = [tuple(item[3]) for item in self._backward_order]
+        self._bwd_propagate = [item[4] for item in self._backward_order]
         # store all the parameters
         self._params = []
         for name in layerorder:
@@ -476,11 +628,12 @@ class Net(object):
         return self._params
 
     def _generate_graph(self):
-        """Validates if a network is executable, and generates the networkx 
-        graph that reflects the execution order.
+        """Validates if a network is executable, and generates the graph
+        that reflects the execution order.
         """
         # first, get input and output blobs.
-        provided_blobs = set(sum(self.provides.values(), []))
+        provided_blobs = set(
+            itertools.chain.from_iterable(self.provides.itervalues()))
         self._input_blobs = [name for name in self.blobs
                              if name not in provided_blobs]
         if len(self._input_blobs):
@@ -492,11 +645,14 @@ class Net(object):
             logging.info('This network produces output blobs: %s',
                          str(self._output_blobs))
         # For any blob that is needed by multiple layers, we will insert a split
-        # layer to avoid gradient overwriting.
+        # layer to avoid gradient overwriting. The names of the split blobs
+        # are kept so we do not need to build them again below.
+        split_names = {}
         for blobname, count in self._need_count.iteritems():
             if count > 1:
                 split_provides = ['_'.join([DECAF_PREFIX, blobname, str(i)])
                                   for i in range(count)]
+                split_names[blobname] = split_provides
                 self.add_layer(
                     SplitLayer(name='_'.join([DECAF_PREFIX, blobname, 'split'])),
                     needs=[blobname], provides=split_provides)
@@ -512,25 +668,52 @@ class Net(object):
                     # instead of connecting it to the original blob, we connect
                     # it to the new splitted blob.
                     actual_needs.append(
-                        '_'.join([DECAF_PREFIX, blobname,
-                                  str(temp_need_idx[blobname])]))
+                        split_names[blobname][temp_need_idx[blobname]])
                     temp_need_idx[blobname] += 1
                 else:
                     actual_needs.append(blobname)
             self._actual_needs[layername] = list(actual_needs)
             logging.debug('Layer %s, needs %s, actual needs %s', layername, str(blobnames), str(actual_needs))
         # Now, create the graph
-        self.graph = nx.DiGraph()
+        self._succ = {}
+        self._pred = {}
         for layername, blobnames in self._actual_needs.iteritems():
             logging.debug('Adding edges from %s to %s (needs)', str(blobnames), layername)
             for blobname in blobnames:
-                self.graph.add_edge(blobname, layername)
+                self._add_edge(blobname, layername)
         for layername, blobnames in self.provides.iteritems():
             logging.debug('Adding edges from %s to %s (provides)', layername, str(blobnames))
             for blobname in blobnames:
-                self.graph.add_edge(layername, blobname)
+                self._add_edge(layername, blobname)
         # Done creating graph!
-        return        
+        return
+
+    def _add_edge(self, source, target):
+        """Adds an edge from source to target to the graph."""
+        self._succ.setdefault(source, []).append(target)
+        self._succ.setdefault(target, [])
+        self._pred.setdefault(target, []).append(source)
+        self._pred.setdefault(source, [])
+
+    def _topological_sort(self):
+        """Returns the nodes of the graph in topological order, using Kahn's
+        algorithm. Raises a DecafError if the graph has a cycle.
+        """
+        in_degree = dict((node, len(preds))
+                         for node, preds in self._pred.iteritems())
+        queue = deque(node for node, degree in in_degree.iteritems()
+                      if degree == 0)
+        order = []
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            for succ in self._succ[node]:
+                in_degree[succ] -= 1
+                if in_degree[succ] == 0:
+                    queue.append(succ)
+        if len(order) != len(in_degree):
+            raise DecafError('The network graph contains a cycle.')
+        return order
                         
     def forward_backward(self, previous_net = None):
         """Runs the forward and backward passes of the net.
@@ -559,12 +742,14 @@ class Net(object):
             # If previous net is a dict, simply mirror all the data.
             for key, arr in previous_net.iteritems():
                 self.blobs[key].mirror(arr)
-        for _, layer, bottom, top in self._forward_order:
-            layer.forward(bottom, top)
+        fns, bottoms, tops = self._fwd_fns, self._fwd_bottoms, self._fwd_tops
+        for i in xrange(len(fns)):
+            fns[i](bottoms[i], tops[i])
         # the backward pass
-        for name, layer, bottom, top, propagate_down in self._backward_order:
-            layer_loss = layer.backward(bottom, top, propagate_down)
-            loss += layer_loss
+        fns, bottoms, tops = self._bwd_fns, self._bwd_bottoms, self._bwd_tops
+        propagate = self._bwd_propagate
+        for i in xrange(len(fns)):
+            loss += fns[i](bottoms[i], tops[i], propagate[i])
         return loss
 
     def predict(self, output_blobs = None, **kwargs):
@@ -582,17 +767,20 @@ class Net(object):
         Output:
             result: a dictionary where the keys are the output blob names, and
                 the values are the numpy arrays storing the blob content.
+                These are the blobs' own arrays and will be overwritten by
+                the next run, so copy them if you need to keep them.
         """
         if not self._finished:
             raise DecafError('Call finish() before you use the network.')
         for name in self._input_blobs:
             self.blobs[name].mirror(kwargs[name])
-        for _, layer, bottom, top in self._forward_order:
-            layer.predict(bottom, top)
+        fns, bottoms, tops = self._pred_fns, self._fwd_bottoms, self._fwd_tops
+        for i in xrange(len(fns)):
+            fns[i](bottoms[i], tops[i])
         if not output_blobs:
             output_blobs = self._output_blobs
-        return dict([(name, self.blobs[name].data())
-                     for name in output_blobs])
+        blobs = self.blobs
+        return {name: blobs[name].data() for name in output_blobs}
     
     def feature(self, blob_name):
         """Returns the data in a specific blob name as the intermediate
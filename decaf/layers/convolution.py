@@ -141,7 +141,7 @@ class ConvolutionLayer(base.Layer):
             raise ValueError('Bottom data should be a 4-dim tensor.')
         kernel_diff = self._kernels.init_diff()
         if self._has_bias:
-            bias_diff = self._bias.init_diff()
+            bias_diff = self._bias.init_diff(setzero=False)
             # bias diff is fairly easy to compute: just sum over all other
             # dimensions
             np.sum(top_diff.reshape(top_diff.size / top_diff.shape[-1],
@@ -149,7 +149,7 @@ class ConvolutionLayer(base.Layer):
                    axis=0, out=bias_diff)
         if propagate_down:
             bottom_diff = bottom[0].init_diff(setzero=False)
-            col_diff = self._col.init_diff()
+            col_diff = self._col.init_diff(setzero=False)
             if self._pad_size == 0:
                 padded_diff = self._padded.mirror_diff(bottom_diff)
             else:
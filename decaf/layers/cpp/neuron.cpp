@@ -1,6 +1,15 @@
 #include <algorithm>
 #include "neuron.h"
 
+// On x86 with gcc, the single precision kernels have an AVX version that is
+// picked at runtime if the cpu supports it, so the library still runs on
+// older cpus. The kernels are memory bound, so AVX mostly helps when the
+// data is in cache.
+#if defined(__GNUC__) && (defined(__x86_64__) || defined(__i386__))
+#define DECAF_NEURON_AVX
+#include <immintrin.h>
+#endif
+
 using std::max;
 
 template <typename Dtype>
@@ -11,11 +20,61 @@ inline void _relu_forward(const Dtype* input, Dtype* output, int n) {
     return;
 }
 
+template <typename Dtype>
+inline void _relu_backward(const Dtype* input, const Dtype* top_diff,
+                           Dtype* bottom_diff, int n) {
+    for (int i = 0; i < n; ++i) {
+        bottom_diff[i] = (input[i] > Dtype(0)) ? top_diff[i] : Dtype(0);
+    }
+    return;
+}
+
+#ifdef DECAF_NEURON_AVX
+static bool _cpu_has_avx() {
+    __builtin_cpu_init();
+    return __builtin_cpu_supports("avx");
+}
+
+static const bool _HAS_AVX = _cpu_has_avx();
+
+__attribute__((target("avx")))
+static void _relu_forward_avx(const float* input, float* output, int n) {
+    const __m256 zero = _mm256_setzero_ps();
+    int i = 0;
+    for (; i + 8 <= n; i += 8) {
+        _mm256_storeu_ps(output + i,
+                         _mm256_max_ps(_mm256_loadu_ps(input + i), zero));
+    }
+    _relu_forward<float>(input + i, output + i, n - i);
+}
+
+__attribute__((target("avx")))
+static void _relu_backward_avx(const float* input, const float* top_diff,
+                               float* bottom_diff, int n) {
+    const __m256 zero = _mm256_setzero_ps();
+    int i = 0;
+    for (; i + 8 <= n; i += 8) {
+        // the comparison gives an all-ones mask where the input is positive.
+        __m256 mask = _mm256_cmp_ps(_mm256_loadu_ps(input + i), zero,
+                                    _CMP_GT_OQ);
+        _mm256_storeu_ps(bottom_diff + i,
+                         _mm256_and_ps(mask, _mm256_loadu_ps(top_diff + i)));
+    }
+    _relu_backward<float>(input + i, top_diff + i, bottom_diff + i, n - i);
+}
+#endif // DECAF_NEURON_AVX
+
 extern "C" {
 
 void relu_forward(const int len, const void* input, void* output, int n) {
     switch(len) {
     case sizeof(float):
+#ifdef DECAF_NEURON_AVX
+        if (_HAS_AVX) {
+            _relu_forward_avx((const float*) input, (float*) output, n);
+            break;
+        }
+#endif
         _relu_forward<float>((const float*) input, (float*) output, n);
         break;
     case sizeof(double):
@@ -26,4 +85,28 @@ void relu_forward(const int len, const void* input, void* output, int n) {
     } // switch(len)
 }
 
+void relu_backward(const int len, const void* input, const void* top_diff,
+                   void* bottom_diff, int n) {
+    switch(len) {
+    case sizeof(float):
+#ifdef DECAF_NEURON_AVX
+        if (_HAS_AVX) {
+            _relu_backward_avx((const float*) input, (const float*) top_diff,
+                               (float*) bottom_diff, n);
+            break;
+        }
+#endif
+        _relu_backward<float>((const float*) input, (const float*) top_diff,
+                              (float*) bottom_diff, n);
+        break;
+    case sizeof(double):
+        _relu_backward<double>((const double*) input,
+                               (const double*) top_diff,
+                               (double*) bottom_diff, n);
+        break;
+    default:
+        exit(EXIT_FAILURE);
+    } // switch(len)
+}
+
 }
@@ -5,6 +5,9 @@ extern "C" {
 
 void relu_forward(const int len, const void* input, void* output, int n);
 
+void relu_backward(const int len, const void* input, const void* top_diff,
+                   void* bottom_diff, int n);
+
 } // extern "C"
 
 #endif // _DECAF_NEURON_H
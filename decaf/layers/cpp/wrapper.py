@@ -150,10 +150,18 @@ def lrn_backward(bottom, top, bottom_diff, top_diff, scale, size, k, alpha,
 ################################################################################
 # local contrast normalization operation
 ################################################################################
-_DLL.relu_forward.restype = None
+_DLL.relu_forward.restype = \
+_DLL.relu_backward.restype = None
 
 def relu_forward(bottom, top):
     _DLL.relu_forward(ct.c_int(bottom.itemsize),
                       bottom.ctypes.data_as(ct.c_void_p),
                       top.ctypes.data_as(ct.c_void_p),
                       ct.c_int(bottom.size))
+
+def relu_backward(bottom, top_diff, bottom_diff):
+    _DLL.relu_backward(ct.c_int(bottom.itemsize),
+                       bottom.ctypes.data_as(ct.c_void_p),
+                       top_diff.ctypes.data_as(ct.c_void_p),
+                       bottom_diff.ctypes.data_as(ct.c_void_p),
+                       ct.c_int(bottom.size))
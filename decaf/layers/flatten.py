@@ -1,7 +1,8 @@
 """Implements the flatten layer."""
 
 from decaf import base
-import numpy as np
+from operator import mul
+
 
 class FlattenLayer(base.Layer):
     """A layer that flattens the data to a 1-dim vector (the resulting
@@ -11,8 +12,7 @@ class FlattenLayer(base.Layer):
         """Computes the forward pass."""
         for blob_b, blob_t in zip(bottom, top):
             shape = blob_b.data().shape
-            newshape = (shape[0], np.prod(shape[1:]))
-            blob_t.mirror(blob_b, shape=newshape)
+            blob_t.mirror(blob_b, shape=(shape[0], reduce(mul, shape[1:], 1)))
 
     def backward(self, bottom, top, propagate_down):
         """Computes the backward pass."""
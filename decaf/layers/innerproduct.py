@@ -19,6 +19,10 @@ class InnerProductLayer(base.Layer):
             bias_filler: a filler to initialize the bias.
             bias: if True, the inner product will contain a bias term.
                 Default True.
+            flatten: if True, each input data point is flattened to a vector
+                first, so that the layer can directly follow e.g. an image
+                or a convolution output without a FlattenLayer in between.
+                Default False.
         """
         base.Layer.__init__(self, **kwargs)
         self._num_output = self.spec.get('num_output', 0)
@@ -36,10 +40,23 @@ class InnerProductLayer(base.Layer):
         else:
             self._param = [self._weight]
     
+    def _features(self, bottom):
+        """Returns the input features, flattened to a 2-dim view if the
+        layer is asked to flatten its input.
+        """
+        features = bottom[0].data()
+        # we look up the spec here so that layers pickled before the flatten
+        # option was introduced still work.
+        if self.spec.get('flatten', False) and features.ndim != 2:
+            features = features.view()
+            features.shape = (features.shape[0],
+                              features.size / features.shape[0])
+        return features
+
     def forward(self, bottom, top):
         """Computes the forward pass."""
         # Get features and output
-        features = bottom[0].data()
+        features = self._features(bottom)
         output = top[0].init_data(
             features.shape[:-1] + (self._num_output,), features.dtype,
             setdata=False)
@@ -59,7 +76,7 @@ class InnerProductLayer(base.Layer):
         """Computes the backward pass."""
         # get diff
         top_diff = top[0].diff()
-        features = bottom[0].data()
+        features = self._features(bottom)
         # compute the gradient
         weight_diff = self._weight.init_diff(setzero=False)
         blasdot.dot_firstdims(features, top_diff, out=weight_diff)
@@ -70,6 +87,9 @@ class InnerProductLayer(base.Layer):
         # If necessary, compute the bottom Blob gradient.
         if propagate_down:
             bottom_diff = bottom[0].init_diff(setzero=False)
+            # take a view with the same (possibly flattened) shape as features.
+            bottom_diff = bottom_diff.view()
+            bottom_diff.shape = features.shape
             blasdot.dot_lastdim(top_diff, self._weight.data().T,
                                 out=bottom_diff)
         if self._reg is not None:
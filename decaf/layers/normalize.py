@@ -14,8 +14,9 @@ class MeanNormalizeLayer(base.Layer):
 
     def forward(self, bottom, top):
         """Computes the backward pass."""
-        features = bottom[0].data()
-        output = top[0].init_data(features.shape, features.dtype, setdata=False)
+        features = bottom[0].data().view()
+        output = top[0].init_data(
+            features.shape, features.dtype, setdata=False).view()
         # Create 2-dimenisonal views of the features and outputs.
         features.shape = (features.size / features.shape[-1], features.shape[-1])
         output.shape = features.shape
@@ -25,8 +26,8 @@ class MeanNormalizeLayer(base.Layer):
     def backward(self, bottom, top, propagate_down):
         """Computes the backward pass."""
         if propagate_down:
-            top_diff = top[0].diff()
-            bottom_diff = bottom[0].init_diff(setzero=False)
+            top_diff = top[0].diff().view()
+            bottom_diff = bottom[0].init_diff(setzero=False).view()
             top_diff.shape = (top_diff.size / top_diff.shape[-1], top_diff.shape[-1])
             bottom_diff.shape = top_diff.shape
             bottom_diff[:] = top_diff
@@ -59,8 +60,9 @@ class ResponseNormalizeLayer(base.Layer):
     def forward(self, bottom, top):
         """Computes the forward pass."""
         # Get features and output
-        features = bottom[0].data()
-        output = top[0].init_data(features.shape, features.dtype, setdata=False)
+        features = bottom[0].data().view()
+        output = top[0].init_data(
+            features.shape, features.dtype, setdata=False).view()
         # Create 2-dimenisonal views of the features and outputs.
         features.shape = (features.size / features.shape[-1], features.shape[-1])
         output.shape = features.shape
@@ -74,10 +76,10 @@ class ResponseNormalizeLayer(base.Layer):
     def backward(self, bottom, top, propagate_down):
         """Computes the backward pass."""
         if propagate_down:
-            features = bottom[0].data()
-            output = top[0].data()
-            top_diff = top[0].diff()
-            bottom_diff = bottom[0].init_diff(setzero=False)
+            features = bottom[0].data().view()
+            output = top[0].data().view()
+            top_diff = top[0].diff().view()
+            bottom_diff = bottom[0].init_diff(setzero=False).view()
             scale = self._scale
             # Create 2-dimenisonal views of the features and outputs.
             features.shape = (features.size / features.shape[-1],
@@ -43,6 +43,14 @@ class PuffSamplerLayer(base.DataLayer):
     def forward(self, bottom, top):
         """The forward pass."""
         for puff, top_blob in zip(self._puffs, top):
-            top_blob.mirror(puff.read(self._minibatch))
+            data = top_blob.data()
+            if (data is not None and
+                data.shape == (self._minibatch,) + puff.shape() and
+                data.dtype == puff.dtype() and data.flags.c_contiguous and
+                data.flags.writeable):
+                # read the next minibatch into the previous one's buffer.
+                puff.read(self._minibatch, out=data)
+            else:
+                top_blob.mirror(puff.read(self._minibatch))
         return
 
@@ -2,7 +2,7 @@
 
 from decaf import base
 import numpy as np
-from decaf.util import logexp
+from decaf.util import blasdot, logexp
 
 
 class RegularizationAsLossLayer(base.LossLayer):
@@ -52,10 +52,11 @@ class L2Regularizer(base.Regularizer):
     def reg(self, blob):
         """The reg function."""
         data = blob.data()
-        #pylint: disable=W0612
         diff = blob.diff()
-        diff += self._weight * 2. * data
-        return np.dot(data.flat, data.flat) * self._weight
+        blasdot.axpy(data, diff, self._weight * 2.)
+        # data is C-contiguous, so ravel() does not copy.
+        flat = data.ravel()
+        return np.dot(flat, flat) * self._weight
 
 L2RegularizerLossLayer = make_loss_layer_class(L2Regularizer)
 
@@ -66,10 +67,11 @@ class L1Regularizer(base.Regularizer):
     def reg(self, blob):
         """The reg function."""
         data = blob.data()
-        #pylint: disable=W0612
         diff = blob.diff()
-        diff += self._weight * np.sign(data)
-        return np.abs(data).sum() * self._weight
+        sign = np.sign(data)
+        blasdot.axpy(sign, diff, self._weight)
+        # |x| = sign(x) * x, which saves another temporary array.
+        return np.dot(sign.ravel(), data.ravel()) * self._weight
 
 
 L1RegularizerLossLayer = make_loss_layer_class(L1Regularizer)
@@ -2,6 +2,12 @@
 
 from decaf import base
 from decaf.layers.cpp import wrapper
+import numpy as np
+
+# The dtypes that the c++ relu kernels support. Other dtypes, and arrays that
+# are not C-contiguous, go through numpy.
+_KERNEL_DTYPES = (np.dtype(np.float32), np.dtype(np.float64))
+
 
 class ReLULayer(base.Layer):
     """A layer that implements the Regularized Linear Unit (ReLU) operation
@@ -17,10 +23,12 @@ class ReLULayer(base.Layer):
         """Computes the forward pass."""
         # Get features and output
         features = bottom[0].data()
-        output = top[0].init_data(features.shape, features.dtype)
-        wrapper.relu_forward(features, output)
-        #output[:] = features
-        #output *= (features > 0)
+        output = top[0].init_data(features.shape, features.dtype,
+                                  setdata=False)
+        if features.dtype in _KERNEL_DTYPES and features.flags.c_contiguous:
+            wrapper.relu_forward(features, output)
+        else:
+            np.maximum(features, 0, out=output)
 
     def backward(self, bottom, top, propagate_down):
         """Computes the backward pass."""
@@ -28,9 +36,20 @@ class ReLULayer(base.Layer):
             return 0.
         top_diff = top[0].diff()
         features = bottom[0].data()
-        bottom_diff = bottom[0].init_diff()
-        bottom_diff[:] = top_diff
-        bottom_diff *= (features > 0)
+        if (features.dtype in _KERNEL_DTYPES and
+            top_diff.dtype == features.dtype and
+            features.flags.c_contiguous and top_diff.flags.c_contiguous):
+            # Nothing reads the top diff after this layer, so the kernel
+            # masks it in place and the bottom diff mirrors it, which saves
+            # writing a separate bottom diff buffer.
+            wrapper.relu_backward(features, top_diff, top_diff)
+            bottom[0].mirror_diff(top[0])
+        else:
+            bottom_diff = bottom[0].init_diff(setzero=False)
+            # write the mask straight into bottom_diff so that no temporary
+            # boolean array is created.
+            np.greater(features, 0, out=bottom_diff)
+            bottom_diff *= top_diff
         return 0.
 
     def update(self):
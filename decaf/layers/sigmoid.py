@@ -16,7 +16,8 @@ class SigmoidLayer(base.Layer):
         """Computes the forward pass."""
         # Get features and top_data
         bottom_data = bottom[0].data()
-        top_data = top[0].init_data(bottom_data.shape, bottom_data.dtype)
+        top_data = top[0].init_data(bottom_data.shape, bottom_data.dtype,
+                                    setdata=False)
         numexpr.evaluate('1. / (exp(-bottom_data) + 1.)', out=top_data)
 
     def backward(self, bottom, top, propagate_down):
@@ -24,7 +25,7 @@ class SigmoidLayer(base.Layer):
         if propagate_down:
             top_data = top[0].data()
             top_diff = top[0].diff()
-            bottom_diff = bottom[0].init_diff()
+            bottom_diff = bottom[0].init_diff(setzero=False)
             numexpr.evaluate('top_data * top_diff * (1. - top_data)', out=bottom_diff)
         return 0
 
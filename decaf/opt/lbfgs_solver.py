@@ -3,6 +3,7 @@
 from decaf import base
 from decaf.util import mpi
 import logging
+import numpy as np
 from scipy import optimize
 
 _FMIN = optimize.fmin_l_bfgs_b
@@ -32,12 +33,14 @@ class LBFGSSolver(base.Solver):
 
     def _collect_params(self, realloc=False):
         """Collect the network parameters into a long vector.
+
+        fmin_l_bfgs_b only works with double precision, so the vector is
+        always float64 regardless of the dtype of the net parameters.
         """
         params_list = self._decaf_net.params()
         if self._param is None or realloc:
             total_size = sum(p.data().size for p in params_list)
-            dtype = max(p.data().dtype for p in params_list)
-            self._param = base.Blob(shape=total_size, dtype=dtype)
+            self._param = base.Blob(shape=total_size, dtype=np.float64)
             self._param.init_diff()
         current = 0
         collected_param = self._param.data()
@@ -48,21 +51,30 @@ class LBFGSSolver(base.Solver):
             # If we are computing mpi, we will need to reduce the diff.
             diff = param.diff()
             if mpi.SIZE > 1:
-                part = collected_diff[current:current+size]
-                part.shape = diff.shape
-                mpi.COMM.Allreduce(diff, part)
+                if diff.dtype == collected_diff.dtype:
+                    part = collected_diff[current:current+size]
+                    part.shape = diff.shape
+                    mpi.COMM.Allreduce(diff, part)
+                else:
+                    # Allreduce needs the same dtype on both sides, so we
+                    # reduce in the param dtype and convert afterwards.
+                    reduced = np.empty_like(diff)
+                    mpi.COMM.Allreduce(diff, reduced)
+                    collected_diff[current:current+size] = reduced.flat
             else:
                 collected_diff[current:current+size] = diff.flat
             current += size
 
     def _distribute_params(self):
-        """Distribute the parameter to the net.
+        """Distribute the parameter to the net, converting it back to the
+        dtype of each net parameter.
         """
         params_list = self._decaf_net.params()
         current = 0
         for param in params_list:
             size = param.data().size
-            param.data().flat = self._param.data()[current:current+size]
+            param.data().flat = self._param.data()[current:current+size].astype(
+                param.data().dtype, copy=False)
             current += size
 
     def obj(self, variable):
@@ -102,6 +102,11 @@ class StochasticSolver(base.Solver):
         logging.info('(Under mpirun, the given loss will just be an estimate'
                      ' on the root node.)')
         self.initialize_status()
+        params = decaf_net.params()
+        if mpi.SIZE > 1:
+            # the buffers to reduce the gradients in, allocated once here
+            # instead of copying every diff on every iteration.
+            diff_caches = [np.empty_like(param.diff()) for param in params]
         # the main iteration
         timer = Timer()
         logging.info('StochasticSolver: started.')
@@ -110,10 +115,9 @@ class StochasticSolver(base.Solver):
                 loss = mpi.COMM.allreduce(
                     decaf_net.forward_backward(self._previous_net)) / mpi.SIZE
                 # we need to broadcast and average the parameters
-                params = decaf_net.params()
-                for param in params:
+                for param, diff_cache in zip(params, diff_caches):
                     diff = param.diff()
-                    diff_cache = diff.copy()
+                    diff_cache[:] = diff
                     mpi.COMM.Allreduce(diff_cache, diff)
                     diff /= mpi.SIZE
             else:
@@ -210,11 +214,12 @@ class SGDSolver(StochasticSolver):
         """
         learningrate = self._get_learningrate()
         logging.debug('learning rate %f', learningrate)
-        if self.spec['momentum'] > 0:
+        momentum_rate = self.spec['momentum']
+        if momentum_rate > 0:
             # we need to add momentum terms and keep track of them.
             for momentum, param in zip(self._momentum,
                                        self._decaf_net.params()):
-                momentum *= self.spec['momentum']
+                momentum *= momentum_rate
                 diff = param.diff()
                 diff *= learningrate
                 diff += momentum
@@ -282,6 +287,7 @@ class AdagradSolver(StochasticSolver):
         """Computes the update value by multiplying the gradient with the
         learning rate.
         """
+        base_lr = self.spec['base_lr']
         for param, accum in zip(self._decaf_net.params(), self._accum):
             diff = param.diff()
             # add the current gradient to the accumulation
@@ -293,7 +299,7 @@ class AdagradSolver(StochasticSolver):
             # compute the sqrt, and update diff
             np.sqrt(accum_data, out=accum_buffer)
             diff /= accum_buffer
-            diff *= self.spec['base_lr']
+            diff *= base_lr
         return
 
     def snapshot(self, is_final = False):
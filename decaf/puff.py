@@ -1,13 +1,110 @@
 """Puff defines a purely unformatted file format accompanying decaf for easier
 and faster access of numpy arrays.
+
+The data points are stored one after another, each in its C order layout. As
+decaf layers keep the channels as the last dimension, a minibatch of images
+is a single contiguous range of the file that is read sequentially into the
+(num, height, width, channels) array the layers consume, and the channels of
+a pixel are already next to each other as im2col wants them.
 """
 import bisect
 import cPickle as pickle
+import ctypes as ct
 import glob
 import logging
+import mmap
 import numpy as np
 from operator import mul
 import os
+import Queue
+import struct
+import sys
+import threading
+
+# On Linux, we tell the kernel that puff files are read sequentially, which
+# makes it use a larger readahead window for them. POSIX_FADV_SEQUENTIAL is 2
+# on Linux.
+_POSIX_FADV_SEQUENTIAL = 2
+_posix_fadvise = None
+if sys.platform.startswith('linux'):
+    try:
+        _posix_fadvise = ct.CDLL(None).posix_fadvise
+        _posix_fadvise.argtypes = [ct.c_int, ct.c_int64, ct.c_int64, ct.c_int]
+    except (OSError, AttributeError):
+        _posix_fadvise = None
+
+# The buffer size used when copying puff files byte for byte.
+_COPY_BUFFER_SIZE = 4 * 1024 * 1024
+
+# The buffer size of the puff writer. puffmap writes one small array per data
+# point, so we coalesce them into large writes instead of one per call.
+_WRITE_BUFFER_SIZE = 4 * 1024 * 1024
+
+# The approximate size of the chunks that the puff iterator reads at a time.
+_PREFETCH_BYTES = 4 * 1024 * 1024
+
+# The number of items that puffmap reads ahead in a background thread.
+_READ_AHEAD_SIZE = 8
+
+# The icing file stores the shape, dtype and number of the data points of a
+# puff file. It is a little-endian binary header: the magic string, the number
+# of data points (uint64), the number of dimensions (uint8), the length of the
+# dtype string (uint8), the dtype string, and the dimensions (uint32 each).
+# Older icing files are pickled dicts, which we can still read; we also write
+# one for the dtypes that the dtype string does not describe completely, such
+# as record dtypes.
+_ICING_MAGIC = 'ICNG'
+_ICING_HEADER = struct.Struct('<4sQBB')
+
+
+def _advise_sequential(fid):
+    """Hints the kernel that the whole file will be read sequentially. This
+    is only a hint, so it does nothing if it is not supported.
+    """
+    if _posix_fadvise is not None:
+        _posix_fadvise(fid.fileno(), 0, 0, _POSIX_FADV_SEQUENTIAL)
+
+
+def _write_icing(filename, shape, dtype, num):
+    """Writes the icing file of a puff."""
+    dtype = np.dtype(dtype)
+    if np.dtype(dtype.str) != dtype:
+        with open(filename, 'wb') as fid:
+            pickle.dump({'shape': shape, 'dtype': dtype, 'num': num}, fid)
+        return
+    with open(filename, 'wb') as fid:
+        fid.write(_ICING_HEADER.pack(_ICING_MAGIC, num, len(shape),
+                                     len(dtype.str)))
+        fid.write(dtype.str)
+        fid.write(struct.pack('<%dI' % len(shape), *shape))
+
+
+def _read_icing(filename):
+    """Reads the icing file of a puff, and returns a dict containing the
+    shape, dtype and num of the data.
+    """
+    with open(filename, 'rb') as fid:
+        header = fid.read(_ICING_HEADER.size)
+        if header[:len(_ICING_MAGIC)] != _ICING_MAGIC:
+            # An icing file in the old pickle format.
+            fid.seek(0)
+            return pickle.load(fid)
+        _, num, ndim, dtype_len = _ICING_HEADER.unpack(header)
+        dtype = np.dtype(fid.read(dtype_len))
+        shape = struct.unpack('<%dI' % ndim, fid.read(4 * ndim))
+    return {'shape': shape, 'dtype': dtype, 'num': num}
+
+
+def _copy_bytes(src, dst, size):
+    """Appends the first size bytes of the file object src to dst."""
+    src.seek(0)
+    offset = 0
+    while offset < size:
+        chunk = src.read(min(size - offset, _COPY_BUFFER_SIZE))
+        if not chunk:
+            raise IOError('Unexpected end of puff file.')
+        dst.write(chunk)
+        offset += len(chunk)
 
 
 class Puff(object):
@@ -31,9 +128,10 @@ class Puff(object):
         files.sort()
         # shape is the shape of a single data point.
         self._shape = None
-        # step is an internal variable that indicates how many bytes we need
-        # to jump over per data point
+        # step is an internal variable that indicates how many items we need
+        # to jump over per data point, and record_bytes the number of bytes.
         self._step = None
+        self._record_bytes = None
         # num_data is the total number of data in the file
         self._num_data = None
         # the following variables are used to slice a puff
@@ -42,16 +140,24 @@ class Puff(object):
         # the current index of the data.
         self._curr = None
         self._curr_fid = None
+        # the end index of the data in the current file.
+        self._curr_fid_end = None
         # the number of local data
         self._num_local_data = None
         # dtype is the data type of the data
         self._dtype = None
         # iter_count is used to record the iteration status 
         self._iter_count = 0
+        # the chunk of data read ahead by the iterator, and the index of the
+        # next data point to return from it.
+        self._prefetch = None
+        self._prefetch_idx = 0
         # the fids for the opened file. We will assume that there are not too
         # many files so we will keep them open all the time.
         self._fids = []
         self._fid_starts = []
+        # the read-only memory maps of the files, which the data is read from.
+        self._mms = []
         self.open(files)
         self.set_range(start, end)
 
@@ -79,15 +185,27 @@ class Puff(object):
         """A simple iterator to go through the data."""
         self.seek(self._start)
         self._iter_count = 0
+        self._prefetch = None
+        self._prefetch_idx = 0
         return self
 
     def next(self):
-        """The next function."""
-        if self._curr == self._start and self._iter_count:
+        """The next function. The data is read in chunks of about
+        _PREFETCH_BYTES, and the data points returned are views of them.
+        """
+        if self._iter_count == self._num_local_data:
             raise StopIteration
-        else:
-            self._iter_count += 1
-            return self.read(1)[0]
+        if self._prefetch is None or self._prefetch_idx == len(self._prefetch):
+            # Every chunk is a new array, since the data points returned
+            # earlier may still be in use.
+            count = min(max(_PREFETCH_BYTES // self._record_bytes, 1),
+                        self._num_local_data - self._iter_count)
+            self._prefetch = self.read(count)
+            self._prefetch_idx = 0
+        elem = self._prefetch[self._prefetch_idx]
+        self._prefetch_idx += 1
+        self._iter_count += 1
+        return elem
 
     def num_data(self):
         """Return the number of data."""
@@ -112,20 +230,30 @@ class Puff(object):
         """
         self._fids = []
         self._fid_starts = []
+        self._mms = []
         count = 0
         for name in names:
             logging.debug('opening %s', name)
-            icing = pickle.load(open(name[:-5] + '.icing'))
+            icing = _read_icing(name[:-5] + '.icing')
             if not self._dtype:
                 # The first file. Will record the meta information
                 self._shape = icing['shape']
                 self._dtype = icing['dtype']
                 self._step = reduce(mul, self._shape, 1)
+                self._record_bytes = self._step * self._dtype.itemsize
             else:
                 if (self._shape != icing['shape'] or
                     self._dtype != icing['dtype']):
                     raise ValueError('Shards do not have the same data shape or dtype!')
-            self._fids.append(open(name, 'rb'))
+            fid = open(name, 'rb')
+            _advise_sequential(fid)
+            self._fids.append(fid)
+            # mmap does not accept empty files, which have nothing to read.
+            if os.fstat(fid.fileno()).st_size:
+                self._mms.append(
+                    mmap.mmap(fid.fileno(), 0, access=mmap.ACCESS_READ))
+            else:
+                self._mms.append(None)
             self._fid_starts.append(count)
             count += icing['num']
         # add a closing fid location
@@ -137,6 +265,7 @@ class Puff(object):
         self._num_local_data = self._num_data
         self._curr = 0
         self._curr_fid = 0
+        self._curr_fid_end = self._fid_starts[1]
 
     def seek(self, offset):
         """Seek to the beginning of the offset-th data point."""
@@ -146,42 +275,77 @@ class Puff(object):
         # we need to find out which file we are at
         index = bisect.bisect_right(self._fid_starts, offset) - 1
         self._curr_fid = index
-        self._fids[self._curr_fid].seek(
-            (offset - self._fid_starts[index]) * self._step \
-            * self._dtype.itemsize)
+        self._curr_fid_end = self._fid_starts[index + 1]
         self._curr = offset
 
-    def read(self, count):
-        """Read the specified number of data and return as a numpy array."""
+    def _map(self, count):
+        """Returns a flat read-only view of the count data points starting at
+        the current one, backed by the memory map of the current file. The
+        range should not go over the current file.
+        """
+        offset = ((self._curr - self._fid_starts[self._curr_fid]) *
+                  self._record_bytes)
+        try:
+            return np.frombuffer(self._mms[self._curr_fid], dtype=self._dtype,
+                                 count=count * self._step, offset=offset)
+        except (TypeError, ValueError):
+            raise IOError('Unexpected end of puff file.')
+
+    def _advance(self, count):
+        """Moves the current pointer forward by count data points, which
+        should not go over the current file or the local end.
+        """
+        curr = self._curr = self._curr + count
+        # If depleted, we will seek to the next file.
+        if curr == self._curr_fid_end or curr == self._end:
+            self.seek(max(curr % self._end, self._start))
+
+    def read(self, count, out=None, copy=True):
+        """Read the specified number of data and return as a numpy array.
+
+        Input:
+            count: the number of data points to read.
+            out: (optional) a writeable C-contiguous array of shape
+                (count,) + shape() and dtype dtype() to read the data into.
+                Passing the same array for repeated reads avoids allocating a
+                new one each time.
+            copy: (optional) if False and out is not given, a read that does
+                not go over a file boundary or the local end returns a
+                read-only view of the memory mapped file instead of a copy.
+                Default True.
+        """
         if count > self._num_local_data:
             raise ValueError('Not enough data points to read: count %d, limit'
                              ' %d.' % (count, self._num_local_data))
-        fid = self._fids[self._curr_fid]
-        fid_end = self._fid_starts[self._curr_fid + 1]
-        if self._curr + count > self._end:
-            # first, if the range goes over the local end, we will need to
-            # read it in two (or more nested) batches.
-            part = self._end - self._curr
-            if self._shape:
-                data = np.vstack((self.read(part), self.read(count - part)))
-            else:
-                data = np.hstack((self.read(part), self.read(count - part)))
-        elif self._curr + count > fid_end:
-            # second, if the current batch goes over the current fid, we will
-            # need to read it in two or more batches.
-            part = fid_end - self._curr
-            if self._shape:
-                data = np.vstack((self.read(part), self.read(count - part)))
-            else:
-                data = np.hstack((self.read(part), self.read(count - part)))
+        shape = (count,) + self._shape
+        if (not copy and out is None and count > 0 and
+            self._curr + count <= min(self._end, self._curr_fid_end)):
+            data = self._map(count).reshape(shape)
+            self._advance(count)
+            return data
+        if out is None:
+            data = np.empty(shape, dtype=self._dtype)
+        elif (out.shape != shape or out.dtype != self._dtype or
+              not out.flags.c_contiguous or not out.flags.writeable):
+            raise ValueError('The output array should be writeable and'
+                             ' C-contiguous with shape %s and dtype %s.' %
+                             (str(shape), str(self._dtype)))
         else:
-            # if nothing happens, we will simply read a single chunk.
-            data = np.fromfile(fid, self._dtype, count * self._step)
-            self._curr += count
-            # If depleted, we will seek to the next file.
-            if self._curr == fid_end or self._curr == self._end:
-                self.seek(max(self._curr % self._end, self._start))
-        return data.reshape((count,) + self._shape)
+            data = out
+        # We copy from the memory maps into a flat view of the output. If the
+        # range goes over the current file or the local end, we copy it in
+        # several chunks. numpy does the copy without holding the GIL, so the
+        # page faults of a cold file do not block other threads.
+        flat = data.reshape(-1)
+        step = self._step
+        done = 0
+        while done < count:
+            part = min(count - done, self._end - self._curr,
+                       self._curr_fid_end - self._curr)
+            flat[done * step:(done + part) * step] = self._map(part)
+            done += part
+            self._advance(part)
+        return data
 
     def read_all(self):
         """Reads all the data from the file."""
@@ -191,53 +355,101 @@ class Puff(object):
 
 class PuffStreamedWriter(object):
     """A streamed writer to write a large puff incrementally."""
-    def __init__(self, name):
+    def __init__(self, name, dtype=None):
+        """Initializes the writer.
+
+        Input:
+            name: the output puff file name.
+            dtype: (optional) the dtype to store the data in. If given, the
+                input arrays are converted to it, e.g. np.float16 halves the
+                size of stored float32 features. Default None, which stores
+                the data in its input dtype.
+        """
         self._shape = None
         self._num_data = 0
         self._dtype = None
-        self._fid = open(name + '.puff', 'wb')
+        if dtype is not None:
+            dtype = np.dtype(dtype)
+        self._store_dtype = dtype
+        self._fid = open(name + '.puff', 'wb', _WRITE_BUFFER_SIZE)
         self._name = name
     
     def check_validity(self, arr):
         """Checks if the data is valid."""
+        self._check_format(arr.shape, arr.dtype)
+
+    def _check_format(self, shape, dtype):
+        """Checks if the shape and dtype agree with the previous inputs."""
         if self._shape is None:
-            self._shape = arr.shape
-            self._dtype = arr.dtype
+            self._shape = shape
+            self._dtype = dtype
         else:
-            if self._shape != arr.shape or self._dtype != arr.dtype:
+            if self._shape != shape or self._dtype != dtype:
                 raise TypeError('Array invalid with previous inputs! '
                                 'Previous: %s, %s, current: %s %s' %
                                 (str(self._shape), str(self._dtype),
-                                 str(arr.shape), str(arr.dtype)))
+                                 str(shape), str(dtype)))
+
+    def _convert(self, arr):
+        """Converts the array to the dtype to store, if it is given."""
+        if self._store_dtype is None or arr.dtype == self._store_dtype:
+            return arr
+        else:
+            return arr.astype(self._store_dtype)
 
     def write_single(self, arr):
         """Write a single data point."""
         self.check_validity(arr)
-        arr.tofile(self._fid)
+        self._convert(arr).tofile(self._fid)
         self._num_data += 1
 
     def write_batch(self, arr):
         """Write a bunch of data points to file."""
         self.check_validity(arr[0])
-        arr.tofile(self._fid)
+        self._convert(arr).tofile(self._fid)
         self._num_data += arr.shape[0]
 
+    def write_puff(self, puff):
+        """Write all the data points of a puff, regardless of its local
+        range. Unless the data has to be converted to another dtype, the puff
+        files are copied byte for byte, without reading the data into numpy
+        arrays.
+        """
+        self._check_format(puff.shape(), puff.dtype())
+        convert = (self._store_dtype is not None and
+                   self._store_dtype != puff.dtype())
+        for i, fid in enumerate(puff._fids):
+            num = puff._fid_starts[i + 1] - puff._fid_starts[i]
+            if not num:
+                continue
+            if convert:
+                self._convert(np.frombuffer(
+                    puff._mms[i], dtype=puff.dtype(), count=num * puff._step)
+                ).tofile(self._fid)
+            else:
+                _copy_bytes(fid, self._fid, num * puff._record_bytes)
+            self._num_data += num
+
     def finish(self):
         """Finishes a Puff write."""
         if self._num_data == 0:
             raise ValueError('Nothing is written!')
         self._fid.close()
+        if self._store_dtype is not None:
+            dtype = self._store_dtype
+        else:
+            dtype = self._dtype
         logging.debug('Output shape: %s, dtype: %s, num: %s',
-                      self._shape, self._dtype, self._num_data)
-        with open(self._name + '.icing', 'w') as fid:
-            pickle.dump({'shape': self._shape,
-                         'dtype': self._dtype,
-                         'num': self._num_data}, fid)
+                      self._shape, dtype, self._num_data)
+        _write_icing(self._name + '.icing', self._shape, dtype,
+                     self._num_data)
 
 
-def write_puff(arr, name):
-    """Write a single numpy array to puff format."""
-    writer = PuffStreamedWriter(name)
+def write_puff(arr, name, dtype=None):
+    """Write a single numpy array to puff format. If dtype is given, the
+    data is stored in that dtype.
+    """
+    writer = PuffStreamedWriter(name, dtype)
     writer.write_batch(arr)
     writer.finish()
 
@@ -248,8 +460,8 @@ def merge_puff(names, output_name, batch_size=None, delete=None):
         names: a set of file names to be merged. The order does not matter,
             but note that we will sort the names internally.
         output_name: the output file name.
-        batch_size: if None, read the whole file and write it in a single
-            batch. Otherwise, read and write the given size at a time.
+        batch_size: if None, copy each file as a whole without reading it
+            into memory. Otherwise, read and write the given size at a time.
         delete: if True, delete the individual files after merging. Default
             False.
     Note that you usually do not need to merge puffs, since puff naturally
@@ -260,16 +472,20 @@ def merge_puff(names, output_name, batch_size=None, delete=None):
     if batch_size is None:
         for name in names:
             logging.debug('writing %s', name)
-            writer.write_batch(Puff(name).read_all())
+            writer.write_puff(Puff(name))
     else:
         for name in names:
             logging.debug('writing %s', name)
             puff = Puff(name)
-            num = puff.num_data()
-            for curr in range(0, num, batch_size):
-                writer.write_batch(puff.read(batch_size))
-            # write the last batch
-            writer.write_batch(puff.read(num - curr))
+            remaining = puff.num_data()
+            if remaining >= batch_size:
+                buf = np.empty((batch_size,) + puff.shape(), puff.dtype())
+            while remaining >= batch_size:
+                writer.write_batch(puff.read(batch_size, out=buf))
+                remaining -= batch_size
+            # write the last, partial batch
+            if remaining:
+                writer.write_batch(puff.read(remaining))
     if delete:
         for name in names:
             if name.endswith('.puff'):
@@ -295,9 +511,84 @@ def puffmap(func, puff, output_name, write_batch=None):
     """
     writer = PuffStreamedWriter(output_name)
     if write_batch:
-        for elem in puff:
-            writer.write_batch(func(elem))
+        write = writer.write_batch
     else:
-        for elem in puff:
-            writer.write_single(func(elem))
+        write = writer.write_single
+    # The puff is read in a background thread, so that reading the next
+    # items overlaps with running func on the current one.
+    for elem in _read_ahead(puff, _READ_AHEAD_SIZE):
+        write(func(elem))
     writer.finish()
+
+
+def puffmap_batched(func, puff, output_name, batch_size=256):
+    """Similar to puffmap(), but runs the func on batches of puff items, so
+    that a vectorized func is called batch_size times less often.
+    Input:
+        func: a function that takes in an array of puff entries, of shape
+            (num,) + puff.shape(), and returns an array of shape
+            (num,) + output_shape. num is batch_size except for the last
+            batch, which may be smaller.
+        puff: the puff file. May be locally sliced.
+        output_name: the output puff file name.
+        batch_size: the number of items to run func on at a time. Default
+            256.
+    """
+    writer = PuffStreamedWriter(output_name)
+    for batch in _read_ahead(_batches(puff, batch_size), _READ_AHEAD_SIZE):
+        writer.write_batch(func(batch))
+    writer.finish()
+
+
+def _batches(puff, batch_size):
+    """Yields the local data of the puff in batches of batch_size."""
+    puff.reset()
+    num = puff.num_local_data()
+    for start in xrange(0, num, batch_size):
+        yield puff.read(min(batch_size, num - start))
+
+
+def _read_ahead(iterable, size):
+    """Iterates over iterable, while a background thread reads up to size
+    items ahead. Exceptions raised by iterable are raised again here.
+    """
+    items = Queue.Queue(size)
+    stop = threading.Event()
+
+    def _put(entry):
+        """Puts an entry into the queue unless the consumer has stopped."""
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def _reader():
+        """Reads the items and puts them into the queue, followed by a
+        (done, exc_info) entry.
+        """
+        try:
+            for item in iterable:
+                if not _put((False, item)):
+                    return
+        except Exception:
+            _put((True, sys.exc_info()))
+        else:
+            _put((True, None))
+
+    thread = threading.Thread(target=_reader)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            done, value = items.get()
+            if done:
+                if value is not None:
+                    raise value[0], value[1], value[2]
+                return
+            yield value
+    finally:
+        stop.set()
+        thread.join()
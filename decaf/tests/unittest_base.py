@@ -1,5 +1,6 @@
 import cPickle as pickle
 from decaf import base
+from decaf import _blob
 import logging
 import numpy as np
 import numpy.testing as npt
@@ -20,6 +21,18 @@ class TestBlob(unittest.TestCase):
         self.assertTrue(blob.has_data())
         self.assertFalse(blob.has_diff())
         self.assertEqual(blob.data().shape, (1,1))
+        self.assertEqual(blob.data().dtype, _blob.DEFAULT_DTYPE)
+        blob = base.Blob((1,1), np.float64)
+        self.assertEqual(blob.data().dtype, np.float64)
+        # equivalent shapes and dtypes should not reallocate the data.
+        data = blob.data()
+        for shape, dtype in [([1,1], 'float64'), ((1,1), np.dtype('float64'))]:
+            blob.init_data(shape, dtype)
+            self.assertTrue(blob.data() is data)
+        blob = base.Blob(5)
+        data = blob.data()
+        blob.init_data(5)
+        self.assertTrue(blob.data() is data)
     
     def testBlobUpdate(self):
         """testBlobUpdate checks if blob update() succeeds."""
@@ -28,13 +41,31 @@ class TestBlob(unittest.TestCase):
         diff[:] = 1.
         blob.update()
         npt.assert_array_almost_equal(blob.data(), - blob.diff())
+        # check non-contiguous and double precision updates as well.
+        for dtype in [np.float32, np.float64]:
+            blob = base.Blob((4,3), dtype)
+            blob.data()[:] = 1.
+            diff = blob.init_diff()
+            diff[:] = np.random.random_sample(diff.shape)
+            blob.update()
+            npt.assert_array_almost_equal(blob.data(), 1. - blob.diff())
+            blob.mirror_diff(np.ones((3,4), dtype).T)
+            blob.update()
+            npt.assert_array_almost_equal(blob.data(), - diff)
 
     def testBlobPickle(self):
         blob = base.Blob((4,3))
         blob.data()[:] = np.random.random_sample(blob.data().shape)
-        s = pickle.dumps(blob)
+        blob.init_diff()
+        s = pickle.dumps(blob, protocol=pickle.HIGHEST_PROTOCOL)
         blob_recover = pickle.loads(s)
+        self.assertFalse(blob_recover.has_diff())
         npt.assert_array_almost_equal(blob.data(), blob_recover.data())
+        self.assertEqual(blob.data().dtype, blob_recover.data().dtype)
+        # the recovered data should be usable in place.
+        blob_recover.data()[:] = 0.
+        blob_recover.init_diff()
+        blob_recover.update()
         # Test pickling an empty blob
         blob = base.Blob()
         s = pickle.dumps(blob)
@@ -42,6 +73,69 @@ class TestBlob(unittest.TestCase):
         self.assertFalse(blob_recover.has_data())
         self.assertFalse(blob_recover.has_diff())
 
+    def testBlobPool(self):
+        """testBlobPool checks if released buffers are reused safely."""
+        blob = base.Blob((5,7))
+        blob.init_diff()
+        blob.clear()
+        self.assertFalse(blob.has_data())
+        # the released buffers should be reused and reinitialized.
+        blob_b = base.Blob((5,7))
+        diff = blob_b.init_diff()
+        npt.assert_array_equal(blob_b.data(), 0.)
+        npt.assert_array_equal(diff, 0.)
+        # buffers that are still referred to should never be reused.
+        data = blob_b.data()
+        data[:] = 1.
+        blob_b.clear()
+        blob_c = base.Blob((5,7))
+        npt.assert_array_equal(data, 1.)
+        npt.assert_array_equal(blob_c.data(), 0.)
+        # the pool never holds more than _BLOB_POOL_MAX_BYTES.
+        base.clear_blob_pool()
+        num = _blob._BLOB_POOL_MAX_BYTES / (1024 * 1024 * 4) + 2
+        for i in range(num):
+            base.Blob((i + 1, 1024, 1024), np.float32).clear()
+        self.assertLessEqual(
+            sum(arr.nbytes for bucket in _blob._BLOB_POOL.values()
+                for arr in bucket),
+            _blob._BLOB_POOL_MAX_BYTES)
+        # buffers of the same shape that evict each other stay reusable.
+        base.clear_blob_pool()
+        shape = (_blob._BLOB_POOL_MAX_BYTES / (4 * 1024 * 1024) * 3 / 4,
+                 1024, 1024)
+        blobs = [base.Blob(shape, np.float32) for _ in range(2)]
+        for blob in blobs:
+            blob.clear()
+        key = _blob._pool_key(shape, np.float32)
+        self.assertEqual(len(_blob._BLOB_POOL[key]), 1)
+        self.assertEqual(_blob._blob_pool_bytes,
+                         _blob._BLOB_POOL[key][0].nbytes)
+        base.clear_blob_pool()
+        self.assertFalse(any(_blob._BLOB_POOL.values()))
+
+    def testBlobMirror(self):
+        """testBlobMirror checks if mirroring with a new shape leaves the
+        source blob unchanged."""
+        blob_a = base.Blob((4,3))
+        blob_a.init_diff()
+        self.assertTrue(blob_a.data() is blob_a.data())
+        self.assertTrue(blob_a.diff() is blob_a.diff())
+        blob_b = base.Blob()
+        blob_b.mirror(blob_a, shape=(12,))
+        blob_b.mirror_diff(blob_a, shape=(12,))
+        self.assertEqual(blob_b.data().shape, (12,))
+        self.assertEqual(blob_b.diff().shape, (12,))
+        self.assertEqual(blob_a.data().shape, (4,3))
+        self.assertEqual(blob_a.diff().shape, (4,3))
+        blob_b.data()[:] = 1.
+        npt.assert_array_equal(blob_a.data(), 1.)
+        # non-contiguous inputs are made contiguous.
+        arr = np.random.random_sample((3,4)).T
+        blob_b.mirror(arr)
+        self.assertTrue(blob_b.data().flags.c_contiguous)
+        npt.assert_array_equal(blob_b.data(), arr)
+
     def testBlobSwap(self):
         blob_a = base.Blob((4,3))
         blob_b = base.Blob((4,3))
@@ -62,6 +156,45 @@ class TestBlob(unittest.TestCase):
         self.assertEqual(output.shape, (3,4))
 
 
+class TestSplitLayer(unittest.TestCase):
+    def testSplitForward(self):
+        """testSplitForward checks if all tops follow the bottom data."""
+        layer = base.SplitLayer(name='split')
+        bottom = base.Blob((4,3))
+        top = [base.Blob() for _ in range(3)]
+        for shape in [(4,3), (4,3), (2,5)]:
+            bottom.init_data(shape)
+            layer.forward([bottom], top)
+            for blob in top:
+                self.assertTrue(blob.data() is bottom.data())
+
+    def testSplitBackward(self):
+        """testSplitBackward checks if the gradients of all tops are summed."""
+        layer = base.SplitLayer(name='split')
+        bottom = base.Blob((4,3))
+        for num_top in range(1, 5):
+            top = [base.Blob() for _ in range(num_top)]
+            layer.forward([bottom], top)
+            for i, blob in enumerate(top):
+                blob.init_diff()[:] = i + 1.
+            layer.backward([bottom], top, True)
+            npt.assert_array_almost_equal(bottom.diff(),
+                                          num_top * (num_top + 1) / 2.)
+
+    def testSplitBackwardBlocked(self):
+        """testSplitBackwardBlocked checks the blocked accumulation of many
+        large top gradients."""
+        layer = base.SplitLayer(name='split')
+        bottom = base.Blob((7, layer.BLOCK_SIZE / 3 + 1))
+        top = [base.Blob() for _ in range(5)]
+        layer.forward([bottom], top)
+        for blob in top:
+            blob.init_diff()[:] = np.random.random_sample(blob.data().shape)
+        layer.backward([bottom], top, True)
+        npt.assert_array_almost_equal(bottom.diff(),
+                                      sum(blob.diff() for blob in top), 5)
+
+
 class TestNet(unittest.TestCase):
     def setUp(self):
         self.decaf_net = base.Net()
@@ -78,6 +211,64 @@ class TestNet(unittest.TestCase):
         self.assertTrue(any(isinstance(layer, base.SplitLayer)
                              for layer in self.decaf_net.layers.values()))
     
+    def testOrder(self):
+        """testOrder checks if layers run in topological order, and if cycles
+        are rejected."""
+        decaf_net = base.Net()
+        decaf_net.add_layer(base.Layer(name='c'), needs='y', provides='z')
+        decaf_net.add_layer(base.Layer(name='b'), needs='x', provides='y')
+        decaf_net.add_layer(base.Layer(name='a'), provides='x')
+        decaf_net.finish()
+        self.assertEqual([item[0] for item in decaf_net._forward_order],
+                         ['a', 'b', 'c'])
+        decaf_net = base.Net()
+        decaf_net.add_layer(base.Layer(name='a'), needs='x', provides='y')
+        decaf_net.add_layer(base.Layer(name='b'), needs='y', provides='x')
+        self.assertRaises(base.DecafError, decaf_net.finish)
+
+    def testFinishTwice(self):
+        """testFinishTwice checks if finishing an unchanged net again reuses
+        its graph instead of inserting the split layers a second time."""
+        self.decaf_net.finish()
+        self.assertEqual(len(self.decaf_net.layers), 4)
+        filename = tempfile.mktemp('.net')
+        self.decaf_net.save(filename)
+        self.decaf_net.load_from(filename)
+        self.assertEqual(len(self.decaf_net.layers), 4)
+
+    def testSaveLoad(self):
+        """testSaveLoad checks if a net can be saved and loaded, with and
+        without compression."""
+        for compress in [False, True]:
+            filename = tempfile.mktemp('.net')
+            self.decaf_net.save(filename, compress=compress)
+            decaf_net = base.Net.load(filename)
+            self.assertEqual(sorted(decaf_net.layers),
+                             sorted(self.decaf_net.layers))
+
+    def testSaveLoadParams(self):
+        """testSaveLoadParams checks if the parameters can be saved and
+        loaded with save_params and load_params."""
+        decaf_net = base.Net()
+        layer = base.Layer(name='a')
+        layer._param = [base.Blob((4,3)), base.Blob()]
+        layer.param()[0].data()[:] = np.random.random_sample((4,3))
+        decaf_net.add_layer(layer, provides='data')
+        decaf_net.finish()
+        data = layer.param()[0].data().copy()
+        filename = tempfile.mktemp('.npz')
+        decaf_net.save_params(filename)
+        layer.param()[0].data()[:] = 0.
+        decaf_net.load_params(filename)
+        npt.assert_array_equal(layer.param()[0].data(), data)
+        self.assertFalse(layer.param()[1].has_data())
+        # file names without the .npz extension work the same way.
+        filename = tempfile.mktemp()
+        decaf_net.save_params(filename)
+        layer.param()[0].data()[:] = 0.
+        decaf_net.load_params(filename)
+        npt.assert_array_equal(layer.param()[0].data(), data)
+
     def testVisualize(self):
         from decaf.util import visualize
         try:
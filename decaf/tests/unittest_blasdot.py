@@ -52,6 +52,15 @@ class TestBlasdot(unittest.TestCase):
             self.assertTrue(result.flags.f_contiguous)
             np.testing.assert_array_almost_equal(result, result_ref)
 
+    def testaxpy(self):
+        for A, B in self.test_matrices:
+            if A.shape != B.shape:
+                continue
+            result_ref = B + 2. * A
+            result = B.copy(order='A')
+            blasdot.axpy(A, result, 2.)
+            np.testing.assert_array_almost_equal(result, result_ref)
+
 
 @unittest.skipIf(not blasdot._HAS_GPU, 
                  'No cuda gpu found.')
@@ -20,7 +20,7 @@ class TestConvolutionGrad(unittest.TestCase):
         for shape in shapes:
             for ksize, stride, mode in params:
                 print(ksize, stride, mode, shape)
-                input_blob = base.Blob(shape, filler=fillers.GaussianRandFiller())
+                input_blob = base.Blob(shape, np.float64, filler=fillers.GaussianRandFiller())
                 layer = core_layers.ConvolutionLayer(
                     name='conv', ksize=ksize, stride=stride, mode=mode,
                     num_kernels=num_kernels,
@@ -20,7 +20,7 @@ class TestDeconvolutionGrad(unittest.TestCase):
             for num_channels in range(1, 3):
                 for ksize, stride, mode in params:
                     print(num_channels, ksize, stride, mode, shape)
-                    input_blob = base.Blob(shape, filler=fillers.GaussianRandFiller())
+                    input_blob = base.Blob(shape, np.float64, filler=fillers.GaussianRandFiller())
                     layer = core_layers.DeconvolutionLayer(
                         name='deconv', ksize=ksize, stride=stride, mode=mode,
                         num_channels=num_channels,
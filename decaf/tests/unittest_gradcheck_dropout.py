@@ -11,7 +11,7 @@ class TestDropoutGrad(unittest.TestCase):
 
     def testDropoutGrad(self):
         np.random.seed(1701)
-        input_blob = base.Blob((4,3), filler=fillers.GaussianRandFiller())
+        input_blob = base.Blob((4,3), np.float64, filler=fillers.GaussianRandFiller())
         output_blob = base.Blob()
         checker = gradcheck.GradChecker(1e-5)
         
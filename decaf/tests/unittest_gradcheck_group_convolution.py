@@ -21,7 +21,7 @@ class TestGroupConvolutionGrad(unittest.TestCase):
         for shape in shapes:
             for ksize, stride, mode in params:
                 print(ksize, stride, mode, shape)
-                input_blob = base.Blob(shape, filler=fillers.GaussianRandFiller())
+                input_blob = base.Blob(shape, np.float64, filler=fillers.GaussianRandFiller())
                 layer = core_layers.GroupConvolutionLayer(
                     name='gconv', ksize=ksize, stride=stride, mode=mode,
                     num_kernels=num_kernels, group=group,
@@ -31,7 +31,7 @@ class TestGroupConvolutionGrad(unittest.TestCase):
                 print(result)
                 self.assertTrue(result[0])
         # check if we will be able to produce an exception
-        input_blob = base.Blob((1,5,5,3), filler=fillers.GaussianRandFiller())
+        input_blob = base.Blob((1,5,5,3), np.float64, filler=fillers.GaussianRandFiller())
         self.assertRaises(RuntimeError, checker.check,
                           layer, [input_blob], [output_blob])
         
@@ -17,7 +17,7 @@ class TestIm2colGrad(unittest.TestCase):
         params = [(2,1), (2,2), (3,1), (3,2)] 
         for psize, stride in params:
             for shape in shapes:
-                input_blob = base.Blob(shape, filler=fillers.GaussianRandFiller())
+                input_blob = base.Blob(shape, np.float64, filler=fillers.GaussianRandFiller())
                 layer = core_layers.Im2colLayer(name='im2col', psize=psize, stride=stride)
                 result = checker.check(layer, [input_blob], [output_blob])
                 print(result)
@@ -11,7 +11,7 @@ class TestInnerproductGrad(unittest.TestCase):
 
     def testInnerproductGrad(self):
         np.random.seed(1701)
-        input_blob = base.Blob((4,3), filler=fillers.GaussianRandFiller())
+        input_blob = base.Blob((4,3), np.float64, filler=fillers.GaussianRandFiller())
         output_blob = base.Blob()
         checker = gradcheck.GradChecker(1e-5)
         
@@ -41,5 +41,22 @@ class TestInnerproductGrad(unittest.TestCase):
         print(result)
         self.assertTrue(result[0])
 
+    def testInnerproductFlattenGrad(self):
+        np.random.seed(1701)
+        input_blob = base.Blob((4,3,2), np.float64,
+                               filler=fillers.GaussianRandFiller())
+        output_blob = base.Blob()
+        checker = gradcheck.GradChecker(1e-5)
+        ip_layer = core_layers.InnerProductLayer(
+            name='ip', num_output=5, bias=True, flatten=True,
+            filler=fillers.GaussianRandFiller(),
+            bias_filler=fillers.GaussianRandFiller(),
+            reg=None)
+        result = checker.check(ip_layer, [input_blob], [output_blob])
+        print(result)
+        self.assertTrue(result[0])
+        self.assertEqual(output_blob.data().shape, (4,5))
+        self.assertEqual(input_blob.diff().shape, (4,3,2))
+
 if __name__ == '__main__':
     unittest.main()
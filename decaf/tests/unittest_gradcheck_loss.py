@@ -26,8 +26,8 @@ class TestLossGrad(unittest.TestCase):
         layer = core_layers.SquaredLossLayer(name='squared')
         checker = gradcheck.GradChecker(1e-6)
         for shape in shapes:
-            input_blob = base.Blob(shape, filler=fillers.GaussianRandFiller())
-            target_blob = base.Blob(shape, filler=fillers.GaussianRandFiller())
+            input_blob = base.Blob(shape, np.float64, filler=fillers.GaussianRandFiller())
+            target_blob = base.Blob(shape, np.float64, filler=fillers.GaussianRandFiller())
             result = checker.check(layer, [input_blob,target_blob], [],
                                    check_indices = [0])
             print(result)
@@ -39,7 +39,7 @@ class TestLossGrad(unittest.TestCase):
         np.random.seed(1701)
         layer = core_layers.LogisticLossLayer(name='logistic')
         checker = gradcheck.GradChecker(1e-6)
-        input_blob = base.Blob((10,1), filler=fillers.GaussianRandFiller())
+        input_blob = base.Blob((10,1), np.float64, filler=fillers.GaussianRandFiller())
         target_blob = base.Blob((10,), dtype=np.int,
                                 filler=fillers.RandIntFiller(high=2))
         result = checker.check(layer, [input_blob,target_blob], [],
@@ -55,7 +55,7 @@ class TestLossGrad(unittest.TestCase):
         layer = core_layers.AutoencoderLossLayer(name='loss', ratio=0.5)
         checker = gradcheck.GradChecker(1e-5)
         for shape in shapes:
-            input_blob = base.Blob(shape, filler=fillers.RandFiller(min=0.05, max=0.95))
+            input_blob = base.Blob(shape, np.float64, filler=fillers.RandFiller(min=0.05, max=0.95))
             result = checker.check(layer, [input_blob], [])
             print(result)
             self.assertTrue(result[0])
@@ -68,7 +68,7 @@ class TestLossGrad(unittest.TestCase):
         checker = gradcheck.GradChecker(1e-6)
         shape = (10,5)
         # check index input
-        input_blob = base.Blob(shape, filler=fillers.GaussianRandFiller())
+        input_blob = base.Blob(shape, np.float64, filler=fillers.GaussianRandFiller())
         target_blob = base.Blob(shape[:1], dtype=np.int,
                                 filler=fillers.RandIntFiller(high=shape[1]))
         result = checker.check(layer, [input_blob, target_blob], [],
@@ -79,7 +79,7 @@ class TestLossGrad(unittest.TestCase):
         self._testWeight(layer, [input_blob, target_blob])
         
         # check full input
-        target_blob = base.Blob(shape, filler=fillers.RandFiller())
+        target_blob = base.Blob(shape, np.float64, filler=fillers.RandFiller())
         # normalize target
         target_data = target_blob.data()
         target_data /= target_data.sum(1)[:, np.newaxis]
@@ -97,7 +97,7 @@ class TestLossGrad(unittest.TestCase):
         shape = (4,5)
         # For the input, we make sure it is not too close to 0 (which would
         # create numerical issues).
-        input_blob = base.Blob(shape,
+        input_blob = base.Blob(shape, np.float64,
                                filler=fillers.RandFiller(min=0.1, max=0.9))
         # normalize input blob
         input_data = input_blob.data()
@@ -113,7 +113,7 @@ class TestLossGrad(unittest.TestCase):
         self._testWeight(layer, [input_blob, target_blob])
         
         # check full input
-        target_blob = base.Blob(shape, filler=fillers.RandFiller())
+        target_blob = base.Blob(shape, np.float64, filler=fillers.RandFiller())
         # normalize target
         target_data = target_blob.data()
         target_data /= target_data.sum(1)[:, np.newaxis]
@@ -16,7 +16,7 @@ class TestNormalizer(unittest.TestCase):
         checker = gradcheck.GradChecker(1e-5)
         shapes = [(1,5,5,1), (1,5,5,3), (5,5), (1,5)]
         for shape in shapes:
-            input_blob = base.Blob(shape, filler=fillers.GaussianRandFiller())
+            input_blob = base.Blob(shape, np.float64, filler=fillers.GaussianRandFiller())
             layer = core_layers.MeanNormalizeLayer(
                 name='normalize')
             result = checker.check(layer, [input_blob], [output_blob])
@@ -29,7 +29,7 @@ class TestNormalizer(unittest.TestCase):
         checker = gradcheck.GradChecker(1e-5)
         shapes = [(1,5,5,1), (1,5,5,3), (5,5), (1,5)]
         for shape in shapes:
-            input_blob = base.Blob(shape,
+            input_blob = base.Blob(shape, np.float64,
                                    filler=fillers.RandFiller(min=0.1, max=1.))
             layer = core_layers.ResponseNormalizeLayer(
                 name='normalize')
@@ -54,7 +54,7 @@ class TestNormalizer(unittest.TestCase):
         for shape in shapes:
             for alpha in alphas:
                 for beta in betas:
-                    input_blob = base.Blob(shape, filler=fillers.RandFiller())
+                    input_blob = base.Blob(shape, np.float64, filler=fillers.RandFiller())
                     # odd size
                     layer = core_layers.LocalResponseNormalizeLayer(
                         name='normalize', k = 1., alpha=alpha, beta=beta, size=5)
@@ -17,7 +17,7 @@ class TestPaddingGrad(unittest.TestCase):
         pads = [1,2,3]
         for pad in pads:
             for shape in shapes:
-                input_blob = base.Blob(shape, filler=fillers.GaussianRandFiller())
+                input_blob = base.Blob(shape, np.float64, filler=fillers.GaussianRandFiller())
                 layer = core_layers.PaddingLayer(name='padding', pad=pad)
                 result = checker.check(layer, [input_blob], [output_blob])
                 print(result)
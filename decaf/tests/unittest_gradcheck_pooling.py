@@ -19,7 +19,7 @@ class TestPoolingGrad(unittest.TestCase):
         for shape in shapes:
             for psize, stride, mode in params:
                 print(psize, stride, mode, shape)
-                input_blob = base.Blob(shape, filler=fillers.GaussianRandFiller())
+                input_blob = base.Blob(shape, np.float64, filler=fillers.GaussianRandFiller())
                 layer = core_layers.PoolingLayer(
                     name='pool', psize=psize, stride=stride, mode=mode)
                 result = checker.check(layer, [input_blob], [output_blob])
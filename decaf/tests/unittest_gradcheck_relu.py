@@ -16,10 +16,28 @@ class TestReLUGrad(unittest.TestCase):
         layer = core_layers.ReLULayer(name='relu')
         checker = gradcheck.GradChecker(1e-5)
         for shape in shapes:
-            input_blob = base.Blob(shape, filler=fillers.GaussianRandFiller())
+            input_blob = base.Blob(shape, np.float64, filler=fillers.GaussianRandFiller())
             result = checker.check(layer, [input_blob], [output_blob])
             print(result)
             self.assertTrue(result[0])
 
+    def testReLUForwardBackward(self):
+        """Checks the kernel and the numpy paths against each other."""
+        np.random.seed(1701)
+        layer = core_layers.ReLULayer(name='relu')
+        features = np.random.randn(5, 4)
+        for arr in [features, features.astype(np.float32),
+                    features.astype(np.int32)]:
+            input_blob = base.Blob()
+            input_blob.mirror(arr)
+            output_blob = base.Blob()
+            layer.forward([input_blob], [output_blob])
+            np.testing.assert_array_equal(output_blob.data(),
+                                          np.maximum(arr, 0))
+            top_diff = output_blob.init_diff()
+            top_diff[:] = 1
+            layer.backward([input_blob], [output_blob], True)
+            np.testing.assert_array_equal(input_blob.diff(), arr > 0)
+
 if __name__ == '__main__':
     unittest.main()
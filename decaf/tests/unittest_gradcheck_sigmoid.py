@@ -16,7 +16,7 @@ class TestSigmoidGrad(unittest.TestCase):
         layer = core_layers.SigmoidLayer(name='sigmoid')
         checker = gradcheck.GradChecker(1e-5)
         for shape in shapes:
-            input_blob = base.Blob(shape, filler=fillers.GaussianRandFiller())
+            input_blob = base.Blob(shape, np.float64, filler=fillers.GaussianRandFiller())
             # let's check the forward results by the way
             layer.forward([input_blob], [output_blob])
             np.testing.assert_array_almost_equal(
@@ -11,7 +11,7 @@ class TestSoftmaxGrad(unittest.TestCase):
 
     def testSoftmaxGrad(self):
         np.random.seed(1701)
-        input_blob = base.Blob((10,5), filler=fillers.GaussianRandFiller())
+        input_blob = base.Blob((10,5), np.float64, filler=fillers.GaussianRandFiller())
         output_blob = base.Blob()
         layer = core_layers.SoftmaxLayer(name='softmax')
         checker = gradcheck.GradChecker(1e-5)
@@ -15,7 +15,7 @@ class TestSplitGrad(unittest.TestCase):
         checker = gradcheck.GradChecker(1e-5)
         shapes = [(5,4), (5,1), (1,5), (1,5,5), (1,5,5,3), (1,5,5,1)]
         for shape in shapes:
-            input_blob = base.Blob(shape, filler=fillers.GaussianRandFiller())
+            input_blob = base.Blob(shape, np.float64, filler=fillers.GaussianRandFiller())
             layer = base.SplitLayer(name='split')
             result = checker.check(layer, [input_blob], output_blobs)
             print(result)
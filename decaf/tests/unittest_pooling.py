@@ -12,7 +12,7 @@ class TestPoolingGrad(unittest.TestCase):
     def testPoolingGrad(self):
         np.random.seed(1701)
         output_blob = base.Blob()
-        input_blob = base.Blob((1,8,8,3), filler=fillers.GaussianRandFiller())
+        input_blob = base.Blob((1,8,8,3), np.float64, filler=fillers.GaussianRandFiller())
         psize = 3
         stride = 2
         mode = 'max'
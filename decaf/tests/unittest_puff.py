@@ -59,6 +59,63 @@ class TestPuff(unittest.TestCase):
         npt.assert_array_almost_equal(data_recovered[4:8], data)
         npt.assert_array_almost_equal(data_recovered[8], data[0])
 
+    def testPuffStoreDtype(self):
+        fname = tempfile.mktemp()
+        data = np.random.rand(4,3).astype(np.float32)
+        puff.write_puff(data, fname, dtype=np.float16)
+        puff_recovered = puff.Puff(fname)
+        self.assertEqual(puff_recovered.dtype(), np.float16)
+        npt.assert_array_almost_equal(puff_recovered.read_all(), data, 2)
+        # converting a whole puff.
+        puff.write_puff(data, fname + '-single')
+        writer = puff.PuffStreamedWriter(fname + '-converted', np.float16)
+        writer.write_puff(puff.Puff(fname + '-single'))
+        writer.write_single(data[0])
+        writer.finish()
+        puff_recovered = puff.Puff(fname + '-converted')
+        self.assertEqual(puff_recovered.dtype(), np.float16)
+        npt.assert_array_almost_equal(puff_recovered.read(5),
+                                      np.vstack((data, data[:1])), 2)
+
+    def testPuffPickledIcing(self):
+        fname = tempfile.mktemp()
+        data = np.random.rand(4,3).astype(np.float32)
+        puff.write_puff(data, fname)
+        # icing files written by older versions are pickled dicts.
+        with open(fname + '.icing', 'w') as fid:
+            pickle.dump({'shape': (3,), 'dtype': data.dtype, 'num': 4}, fid)
+        puff_recovered = puff.Puff(fname)
+        self.assertEqual(puff_recovered.dtype(), np.float32)
+        npt.assert_array_almost_equal(puff_recovered.read_all(), data)
+
+    def testPuffMerge(self):
+        fname = tempfile.mktemp()
+        data = np.random.rand(4,3)
+        names = [fname + '-%d-of-3' % i for i in range(3)]
+        for name in names:
+            puff.write_puff(data, name)
+        puff.merge_puff(names, fname)
+        puff_recovered = puff.Puff(fname)
+        self.assertEqual(puff_recovered.num_data(), 12)
+        npt.assert_array_almost_equal(puff_recovered.read_all(),
+                                      np.vstack([data] * 3))
+        # batched merges, with and without a partial last batch.
+        for batch_size in [2, 3, 5]:
+            puff.merge_puff(names, fname, batch_size=batch_size)
+            puff_recovered = puff.Puff(fname)
+            self.assertEqual(puff_recovered.num_data(), 12)
+            npt.assert_array_almost_equal(puff_recovered.read_all(),
+                                          np.vstack([data] * 3))
+
+    def testPuffmapBatched(self):
+        fname = tempfile.mktemp()
+        data = np.random.rand(10,3)
+        puff.write_puff(data, fname)
+        puff.puffmap_batched(lambda x: x.sum(1), puff.Puff(fname, 2, 9),
+                             fname + '-sum', batch_size=3)
+        npt.assert_array_almost_equal(puff.Puff(fname + '-sum').read_all(),
+                                      data[2:9].sum(1))
+
     def testPuffMultipleWriteException(self):
         fname = tempfile.mktemp()
         data = np.random.rand(4,3)
@@ -147,6 +204,35 @@ class TestPuff(unittest.TestCase):
         npt.assert_array_almost_equal(puff_recovered.read_all(), data)
         self.assertRaises(ValueError, puff_recovered.seek, 0)
 
+    def testPuffShardedReadBoundary(self):
+        fname = tempfile.mktemp()
+        data = np.random.rand(30,3)
+        for i in range(3):
+            puff.write_puff(data[i*10:(i+1)*10], fname + '-%d-of-3' % i)
+        puff_recovered = puff.Puff(fname + '-*-of-3', start=5, end=27)
+        puff_recovered.seek(8)
+        # this read crosses two file boundaries and wraps around the end.
+        npt.assert_array_almost_equal(
+            puff_recovered.read(21),
+            np.vstack((data[8:27], data[5:7])))
+        npt.assert_array_almost_equal(puff_recovered.read(1), data[7:8])
+        # test reading into a given output array.
+        out = np.empty((3,3))
+        self.assertTrue(puff_recovered.read(3, out=out) is out)
+        npt.assert_array_almost_equal(out, data[8:11])
+        self.assertRaises(ValueError, puff_recovered.read, 2, out)
+        # test reading views of the memory mapped files.
+        view = puff_recovered.read(2, copy=False)
+        self.assertFalse(view.flags.writeable)
+        npt.assert_array_almost_equal(view, data[11:13])
+        npt.assert_array_almost_equal(puff_recovered.read(8, copy=False),
+                                      data[13:21])
+        # read-only output arrays are rejected.
+        self.assertRaises(ValueError, puff_recovered.read, 2, view)
+        out = np.empty((2,3))
+        out.flags.writeable = False
+        self.assertRaises(ValueError, puff_recovered.read, 2, out)
+
 
 if __name__ == '__main__':
     logging.getLogger().setLevel(logging.INFO)
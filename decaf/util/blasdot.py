@@ -2,6 +2,7 @@
 """Efficient dot functions by calling the basic blas functions from scipy."""
 
 import numpy as np
+from scipy.linalg.blas import fblas
 
 # import submodules that implements the blas functions
 import _numpy_blasdot
@@ -11,6 +12,10 @@ try:
 except OSError as err:
     _HAS_GPU = False
 
+# The blas axpy functions, indexed by dtype.
+_AXPY = {np.dtype(np.float32): fblas.saxpy,
+         np.dtype(np.float64): fblas.daxpy}
+
 # The default backend would be the numpy blasdot.
 _gemm_f_contiguous = _numpy_blasdot._gemm_f_contiguous
 _gemm_c_contiguous = _numpy_blasdot._gemm_c_contiguous
@@ -110,3 +115,19 @@ def dot_firstdims(A, B, out=None):
     return out
 
 
+def axpy(X, Y, alpha=1.):
+    """Computes Y += alpha * X in place, and returns Y.
+
+    If X and Y are C-contiguous float32 or float64 arrays of the same dtype,
+    the blas axpy function is called on their flattened views, which avoids
+    the temporary array that numpy would create for alpha * X. Otherwise we
+    fall back to numpy.
+    """
+    axpy_func = _AXPY.get(Y.dtype)
+    if (axpy_func is not None and X.dtype == Y.dtype and
+        X.flags.c_contiguous and Y.flags.c_contiguous):
+        # ravel() returns views here, so axpy writes directly to Y.
+        axpy_func(X.ravel(), Y.ravel(), a=alpha)
+    else:
+        Y += alpha * X
+    return Y
@@ -12,9 +12,11 @@ def translator_fc(cuda_layer, output_shapes):
     input_size = reduce(mul, input_shape)
     num_output = cuda_layer['outputs']
     output_shapes[cuda_layer['name']] = (num_output,)
+    # If the input is not a vector, we let the layer flatten it.
     decaf_layer = core_layers.InnerProductLayer(
         name=cuda_layer['name'],
-        num_output=num_output)
+        num_output=num_output,
+        flatten=(len(input_shape) != 1))
     # put the parameters
     params = decaf_layer.param()
     # weight
@@ -37,11 +39,6 @@ def translator_fc(cuda_layer, output_shapes):
     params[0].mirror(converted_weight)
     bias = cuda_layer['biases'][0]
     params[1].mirror(bias)
-    if len(input_shape) == 1:
-        return decaf_layer
-    else:
-        # If the input is not a vector, we need to have a flatten layer first.
-        return [core_layers.FlattenLayer(name=cuda_layer['name'] + '_flatten'),
-                decaf_layer]
+    return decaf_layer
 
 registerer.register_translator('fc', translator_fc)